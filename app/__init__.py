@@ -1,12 +1,41 @@
 from flask import Flask
 from flask_marshmallow import Marshmallow
+from flask_migrate import Migrate
 from flask_sqlalchemy import SQLAlchemy
 import os
+from app.cache import TTLCache
+from app.metrics import init_metrics
+from app.order_index import OrderIndex
 
 app = Flask(__name__)
 app.config.from_object('config.Config')
 db = SQLAlchemy(app)
 ma = Marshmallow(app)
+migrate = Migrate(app, db)
+# Couriers' information returned by `GET /couriers/$courier_id`
+courier_cache = TTLCache(app.config['COURIER_CACHE_TTL'],
+                         app.config['COURIER_CACHE_SIZE'])
+# Orders available for assignment for `/orders/assign`
+order_index = OrderIndex(app.config['ORDER_INDEX'],
+                         app.config['ORDER_INDEX_TTL'])
+
+# Models are available once `db` is created
+from app.idempotency import IdempotencyStore  # noqa: E402
+# Responses replayed for retried requests with `Idempotency-Key`
+idempotency_store = IdempotencyStore(app.config['IDEMPOTENCY_TTL'],
+                                     app.config['IDEMPOTENCY_CACHE_SIZE'],
+                                     app.config['IDEMPOTENCY_DB'])
+if app.config['METRICS']:
+    metrics = init_metrics(app)
+    metrics.add_counter('candy_idempotency_hits_total',
+                        'Requests with Idempotency-Key found in memory',
+                        lambda: idempotency_store.cache.hits)
+    metrics.add_counter('candy_idempotency_db_hits_total',
+                        'Requests with Idempotency-Key found '
+                        'in the database', lambda: idempotency_store.db_hits)
+    metrics.add_counter('candy_idempotency_misses_total',
+                        'Requests with Idempotency-Key not found '
+                        'in memory', lambda: idempotency_store.cache.misses)
 
 from app import views
 from app.models import Couriers
@@ -0,0 +1,57 @@
+""" Archival of completed work.
+
+    Completed bundles are moved with their orders and orders' delivery
+    hours from `orders_bundle`, `orders` and `delivery_hours` into the
+    archive tables with the same columns, so the tables and indexes
+    used by assignment and completion only hold open work and recent
+    history. Couriers' earnings and ratings and `regions` statistics
+    are stored separately and don't change. Rows are copied as they
+    are by `INSERT ... SELECT` and deleted in the same transaction.
+"""
+from sqlalchemy import select
+from app import db
+from app.models import (DeliveryHours, Orders, OrdersBundle,
+                        delivery_hours_archive, orders_archive,
+                        orders_bundle_archive)
+
+
+def move_rows(table, archive, condition):
+    """ Moves rows of `table` matching `condition` to `archive`.
+        Changes are not committed.
+    """
+    columns = [column.name for column in archive.columns]
+    rows = select(*[table.c[name] for name in columns]).where(condition)
+    db.session.execute(archive.insert().from_select(columns, rows))
+    db.session.execute(table.delete().where(condition))
+
+
+def archive_bundles(completed_before, limit):
+    """ Moves at most `limit` bundles completed before
+        `completed_before` (`datetime`) to the archive together with
+        their orders and delivery hours. Bundles locked by other
+        transactions are skipped. Returns the number of moved bundles.
+        Changes are committed.
+    """
+    bundle_ids = [bundle_id for bundle_id, in
+                  db.session.query(OrdersBundle.bundle_id)
+                            .filter(OrdersBundle.completed,
+                                    OrdersBundle.complete_time <
+                                    completed_before)
+                            .order_by(OrdersBundle.bundle_id)
+                            .limit(limit)
+                            .with_for_update(skip_locked=True)]
+    if len(bundle_ids) == 0:
+        db.session.rollback()
+        return 0
+
+    # Completed bundles only hold completed orders, dismissed
+    # orders are detached from their bundles
+    order_ids = select(Orders.order_id).where(Orders.bundle.in_(bundle_ids))
+    move_rows(DeliveryHours.__table__, delivery_hours_archive,
+              DeliveryHours.order_id.in_(order_ids))
+    move_rows(Orders.__table__, orders_archive,
+              Orders.bundle.in_(bundle_ids))
+    move_rows(OrdersBundle.__table__, orders_bundle_archive,
+              OrdersBundle.bundle_id.in_(bundle_ids))
+    db.session.commit()
+    return len(bundle_ids)
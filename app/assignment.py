@@ -0,0 +1,147 @@
+""" Orders assignment strategies.
+
+    Every strategy takes a `list` of orders which the courier is able
+    to deliver (his regions and working hours are already checked),
+    his load capacity in kilograms and a deadline in `time.monotonic()`
+    seconds. It returns a `list` of orders whose total weight doesn't
+    exceed the capacity.
+"""
+import time
+
+
+def weight_units(weight):
+    """ Converts weight in kilograms into integer hundredths
+        of kilogram, so loads are summed up without float errors.
+    """
+    return int(round(weight * 100))
+
+
+def first_fit(orders, capacity, deadline=None):
+    """ Takes orders in the received order while they fit
+        into the courier's remaining capacity.
+    """
+    capacity = weight_units(capacity)
+    assigned = []
+    for order in orders:
+        weight = weight_units(order.weight)
+        if weight <= capacity:
+            capacity -= weight
+            assigned.append(order)
+    return assigned
+
+
+def first_fit_decreasing(orders, capacity, deadline=None):
+    """ First fit over orders sorted from the heaviest to the lightest
+        one, which leaves less unused capacity than first fit in
+        arbitrary order.
+    """
+    orders = sorted(orders, key=lambda order: order.weight, reverse=True)
+    return first_fit(orders, capacity)
+
+
+def branch_and_bound(orders, capacity, deadline=None):
+    """ Searches for the subset of orders with the maximal total weight
+        not exceeding the courier's capacity (0/1 knapsack where value
+        is weight). Orders are explored from the heaviest one, a branch
+        is cut when even all the remaining orders can't beat the best
+        load found so far. The search starts from the first fit
+        decreasing solution and returns the best one found when the
+        capacity is filled completely or the deadline is reached.
+    """
+    orders = sorted(orders, key=lambda order: order.weight, reverse=True)
+    weights = [weight_units(order.weight) for order in orders]
+    capacity = weight_units(capacity)
+
+    # remaining[i] is the total weight of orders starting from i
+    remaining = [0] * (len(weights) + 1)
+    for i in range(len(weights) - 1, -1, -1):
+        remaining[i] = remaining[i + 1] + weights[i]
+
+    # First fit decreasing solution
+    best = []
+    best_load = 0
+    for i, weight in enumerate(weights):
+        if best_load + weight <= capacity:
+            best.append(i)
+            best_load += weight
+
+    taken = []
+    load = 0
+    i = 0
+    steps = 0
+    while best_load < capacity:
+        while i < len(weights) and load + remaining[i] > best_load:
+            if load + weights[i] <= capacity:
+                taken.append(i)
+                load += weights[i]
+            i += 1
+        if load > best_load:
+            best = list(taken)
+            best_load = load
+        if not taken:
+            break
+        # Backtracking: the latest taken order is skipped instead
+        i = taken.pop()
+        load -= weights[i]
+        i += 1
+
+        steps += 1
+        if deadline is not None and steps % 256 == 0 and \
+                time.monotonic() >= deadline:
+            break
+
+    return [orders[i] for i in best]
+
+
+""" Available strategies, chosen by `ASSIGNMENT_STRATEGY` config value """
+STRATEGIES = {
+    'first_fit': first_fit,
+    'first_fit_decreasing': first_fit_decreasing,
+    'branch_and_bound': branch_and_bound
+}
+
+
+def pack(orders, capacity, strategy, time_budget):
+    """ Selects orders for the courier with the `strategy` from
+        `STRATEGIES` spending no more than `time_budget` seconds.
+    """
+    deadline = time.monotonic() + time_budget
+    return STRATEGIES[strategy](orders, capacity, deadline)
+
+
+def pack_many(candidates, capacities, strategy, time_budget):
+    """ Distributes orders among several couriers. `candidates` is
+        a `dict` of orders each courier is able to deliver and
+        `capacities` is a `dict` of their load capacities, both by
+        courier id. Couriers with the least total weight of candidates
+        choose first, so couriers who have no alternatives are loaded
+        before the others take their orders. Among equal orders
+        the ones fewer couriers are able to deliver are preferred.
+        Each courier's orders are selected with the `strategy`, all of
+        them within `time_budget` seconds: once it's spent the rest of
+        couriers get `first_fit_decreasing` selection.\n
+        Returns a `dict` of selected orders by courier id.
+    """
+    demand = {}
+    for orders in candidates.values():
+        for order in orders:
+            demand[order.order_id] = demand.get(order.order_id, 0) + 1
+
+    def candidates_weight(courier_id):
+        return sum(order.weight for order in candidates[courier_id])
+
+    # The deadline is shared by all the couriers
+    deadline = time.monotonic() + time_budget
+    taken = set()
+    assigned = {}
+    for courier_id in sorted(candidates, key=candidates_weight):
+        orders = sorted((order for order in candidates[courier_id]
+                         if order.order_id not in taken),
+                        key=lambda order: (demand[order.order_id],
+                                           order.order_id))
+        if time.monotonic() >= deadline:
+            strategy = 'first_fit_decreasing'
+        assigned[courier_id] = STRATEGIES[strategy](
+            orders, capacities[courier_id], deadline)
+        taken.update(order.order_id for order in assigned[courier_id])
+    return assigned
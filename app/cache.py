@@ -0,0 +1,54 @@
+""" In-process cache of responses.
+
+    Every gunicorn worker has its own cache, so after invalidation
+    in one worker the others may return a stale value until its
+    time to live expires. Keep TTL short for data which changes.
+"""
+import time
+from collections import OrderedDict
+from threading import Lock
+
+
+class TTLCache:
+    """ Cache keeping at most `max_size` values for `ttl` seconds.
+        When it's full, the least recently used value is evicted.
+        `ttl` equal to `0` disables the cache.
+    """
+
+    def __init__(self, ttl, max_size):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.values = OrderedDict()
+        self.lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """ Returns the cached value or `None` """
+        with self.lock:
+            item = self.values.get(key)
+            if item is None or item[0] < time.monotonic():
+                if item is not None:
+                    del self.values[key]
+                self.misses += 1
+                return None
+            self.values.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def set(self, key, value):
+        if self.ttl <= 0:
+            return
+        with self.lock:
+            self.values[key] = (time.monotonic() + self.ttl, value)
+            self.values.move_to_end(key)
+            while len(self.values) > self.max_size:
+                self.values.popitem(last=False)
+
+    def invalidate(self, key):
+        with self.lock:
+            self.values.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.values.clear()
@@ -0,0 +1,135 @@
+""" Replay of responses to retried requests.
+
+    A client sends a unique `Idempotency-Key` header with a request and
+    repeats it when the request is retried. The first response with the
+    key is saved and returned to the retries without running the
+    routing again, with `Idempotent-Replayed: true` header. Server
+    errors aren't saved, so such requests may be retried for real.
+    Keys are scoped by path, a key reused with another request body
+    is rejected. Requests without the header are not affected.\n
+    Every worker keeps responses in its own `TTLCache`. With the shared
+    store they are also saved in `idempotency_keys` table, so a retry
+    sent to another worker is replayed as well. Requests with the same
+    key sent at the same time may both run, the routings are still
+    safe then: courier's orders are changed by one request at a time
+    and completing a completed order changes nothing.
+"""
+import hashlib
+from datetime import datetime, timedelta, timezone
+from functools import wraps
+from flask import Response, current_app, jsonify, request
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.cache import TTLCache
+from app.models import IdempotencyKeys
+
+KEY_HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+
+
+class IdempotencyStore:
+    """ Saved responses by `(path, key)` kept for `ttl` seconds,
+        at most `max_size` of them in memory. `shared` enables
+        the database store, `ttl` equal to `0` disables replays.
+    """
+
+    def __init__(self, ttl, max_size, shared):
+        self.ttl = ttl
+        self.shared = shared
+        self.cache = TTLCache(ttl, max_size)
+        # Keys found in the database, memory hits and misses
+        # are counted by the cache
+        self.db_hits = 0
+
+    @property
+    def enabled(self):
+        return self.ttl > 0
+
+    def get(self, path, key):
+        """ Returns the saved `(fingerprint, status, content type, body)`
+            or `None`
+        """
+        saved = self.cache.get((path, key))
+        if saved is not None or not self.shared:
+            return saved
+        row = (IdempotencyKeys.query
+               .filter(IdempotencyKeys.route == path,
+                       IdempotencyKeys.key == key,
+                       IdempotencyKeys.created > self.expired_before())
+               .first())
+        if row is None:
+            return None
+        self.db_hits += 1
+        saved = (row.fingerprint, row.status, row.content_type, row.body)
+        self.cache.set((path, key), saved)
+        return saved
+
+    def set(self, path, key, saved):
+        """ Saves `(fingerprint, status, content type, body)`. All the
+            changes of the routing are already committed, anything
+            left in the session is rolled back.
+        """
+        self.cache.set((path, key), saved)
+        if not self.shared:
+            return
+        db.session.rollback()
+        # An expired response with the same key is replaced
+        (IdempotencyKeys.query
+         .filter(IdempotencyKeys.route == path,
+                 IdempotencyKeys.key == key,
+                 IdempotencyKeys.created <= self.expired_before())
+         .delete(synchronize_session=False))
+        fingerprint, status, content_type, body = saved
+        db.session.add(IdempotencyKeys(route=path, key=key,
+                                       fingerprint=fingerprint,
+                                       status=status,
+                                       content_type=content_type,
+                                       body=body,
+                                       created=datetime.now(timezone.utc)))
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Saved by a concurrent request with the same key
+            db.session.rollback()
+
+    def expired_before(self):
+        return datetime.now(timezone.utc) - timedelta(seconds=self.ttl)
+
+    def replay(self, view):
+        """ Decorator of routings whose responses are replayed
+            for requests with the same `Idempotency-Key`
+        """
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            key = request.headers.get(KEY_HEADER)
+            if key is None or not self.enabled:
+                return view(*args, **kwargs)
+            if len(key) == 0 or len(key) > MAX_KEY_LENGTH:
+                bad_request_msg = {
+                    'Error': f'{KEY_HEADER} should be from 1 to '
+                             f'{MAX_KEY_LENGTH} characters long'
+                }
+                return jsonify(bad_request_msg), 400
+
+            fingerprint = hashlib.sha256(request.get_data()).hexdigest()
+            saved = self.get(request.path, key)
+            if saved is not None:
+                if saved[0] != fingerprint:
+                    bad_request_msg = {
+                        'Error': f'{KEY_HEADER} was used '
+                                 f'for another request'
+                    }
+                    return jsonify(bad_request_msg), 422
+                return Response(saved[3], status=saved[1],
+                                content_type=saved[2],
+                                headers={'Idempotent-Replayed': 'true'})
+
+            response = current_app.make_response(view(*args, **kwargs))
+            if response.status_code < 500:
+                self.set(request.path, key,
+                         (fingerprint, response.status_code,
+                          response.content_type,
+                          response.get_data(as_text=True)))
+            return response
+
+        return wrapper
@@ -0,0 +1,301 @@
+""" Listing and export of couriers and orders.
+
+    Lists are sorted by id and paginated with a keyset cursor: a page
+    holds ids greater than the cursor and returns its last id as the
+    cursor of the next page, so every page is read by a range scan of
+    the primary key however deep it is and pages don't shift when
+    rows are added. Orders include archived ones.\n
+    NDJSON export writes all the matching rows, one JSON object per
+    line. Rows are fetched from a server-side cursor in chunks and
+    written as they are read, so the memory used doesn't depend
+    on the number of rows.
+"""
+import json
+from datetime import datetime, timezone
+from flask import Response, current_app, jsonify, stream_with_context
+from sqlalchemy import select, union_all
+from app import db
+from app.records import completed_bundles_exist
+from app.models import (CourierRegions, Couriers, DeliveryHours, Orders,
+                        WorkingHours, delivery_hours_archive,
+                        minutes_period, orders_archive)
+from app.utils import CAPACITY
+
+ORDER_STATUSES = ['unassigned', 'assigned', 'completed']
+ORDER_COLUMNS = ['order_id', 'weight', 'region', 'assigned', 'completed',
+                 'assigned_courier', 'assign_time', 'complete_time',
+                 'delivery_time']
+
+
+def non_negative_int(value):
+    number = int(value)
+    if number < 0:
+        raise ValueError
+    return number
+
+
+def timestamp(value):
+    """ Parses ISO 8601 time, UTC if the time zone is omitted """
+    time = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if time.tzinfo is None:
+        time = time.replace(tzinfo=timezone.utc)
+    return time
+
+
+def courier_type(value):
+    if value not in CAPACITY:
+        raise ValueError
+    return value
+
+
+def order_status(value):
+    if value not in ORDER_STATUSES:
+        raise ValueError
+    return value
+
+
+""" Filters of the lists: query parameters and their parsers """
+COURIER_FILTERS = {
+    'region': non_negative_int,
+    'courier_type': courier_type
+}
+ORDER_FILTERS = {
+    'region': non_negative_int,
+    'status': order_status,
+    'courier_id': non_negative_int,
+    'assigned_from': timestamp,
+    'assigned_to': timestamp,
+    'completed_from': timestamp,
+    'completed_to': timestamp
+}
+
+
+def parse_args(args, filters, max_limit):
+    """ Parses query parameters `args` of a list request: `filters`,
+        `cursor`, `limit` up to `max_limit` and `format`. Returns
+        a `dict` of the received parameters' values. Raises
+        `ValueError` with a message if a parameter is incorrect
+        or repeated.
+    """
+    parsers = dict(filters, cursor=non_negative_int, limit=int,
+                   format=str)
+    params = {}
+    for key, values in args.lists():
+        if key not in parsers:
+            raise ValueError(f"Unknown parameter '{key}'")
+        if len(values) != 1:
+            raise ValueError(f"'{key}' should be received once")
+        try:
+            params[key] = parsers[key](values[0])
+        except ValueError:
+            raise ValueError(f"Incorrect value of '{key}'")
+    if not 0 < params.get('limit', 1) <= max_limit:
+        raise ValueError(f"'limit' should be from 1 to {max_limit}")
+    if params.get('format', 'json') not in ['json', 'ndjson']:
+        raise ValueError("'format' should be 'json' or 'ndjson'")
+    return params
+
+
+def couriers_query(params):
+    """ Returns `SELECT` of couriers' columns matching `params` with ids
+        greater than the cursor sorted by id, at most `limit` of them
+    """
+    query = select(Couriers.courier_id, Couriers.courier_type,
+                   Couriers.earnings, Couriers.rating,
+                   completed_bundles_exist().label('has_completed_bundles'))
+    if 'region' in params:
+        query = query.where(Couriers.courier_id.in_(
+            select(CourierRegions.courier_id)
+            .where(CourierRegions.region_id == params['region'])))
+    if 'courier_type' in params:
+        query = query.where(Couriers.courier_type == params['courier_type'])
+    if 'cursor' in params:
+        query = query.where(Couriers.courier_id > params['cursor'])
+    return query.order_by(Couriers.courier_id).limit(params.get('limit'))
+
+
+def orders_query(params):
+    """ Returns `SELECT` of orders' columns matching `params` with ids
+        greater than the cursor sorted by id, at most `limit` of them.
+        Working and archived orders are selected by `UNION ALL`, each
+        part is filtered, sorted and limited the same way, so a page
+        doesn't sort all the orders after the cursor.
+    """
+    tables = [Orders.__table__]
+    # Only completed orders are archived
+    if params.get('status', 'completed') == 'completed':
+        tables.append(orders_archive)
+
+    parts = []
+    for table in tables:
+        columns = table.c
+        conditions = []
+        status = params.get('status')
+        if status == 'unassigned':
+            conditions.append(~columns.assigned)
+        elif status == 'assigned':
+            conditions.extend([columns.assigned, ~columns.completed])
+        elif status == 'completed':
+            conditions.append(columns.completed)
+        if 'region' in params:
+            conditions.append(columns.region == params['region'])
+        if 'courier_id' in params:
+            conditions.append(
+                columns.assigned_courier == params['courier_id'])
+        if 'assigned_from' in params:
+            conditions.append(columns.assign_time >= params['assigned_from'])
+        if 'assigned_to' in params:
+            conditions.append(columns.assign_time < params['assigned_to'])
+        if 'completed_from' in params:
+            conditions.append(
+                columns.complete_time >= params['completed_from'])
+        if 'completed_to' in params:
+            conditions.append(columns.complete_time < params['completed_to'])
+        if 'cursor' in params:
+            conditions.append(columns.order_id > params['cursor'])
+        parts.append(select(*[columns[name] for name in ORDER_COLUMNS])
+                     .where(*conditions)
+                     .order_by(columns.order_id)
+                     .limit(params.get('limit')))
+
+    if len(parts) == 1:
+        return parts[0]
+    # Sorted and limited parts are wrapped into subqueries for SQLite
+    orders = union_all(*[select(part.subquery()) for part in parts])
+    orders = orders.subquery()
+    return (select(orders).order_by(orders.c.order_id)
+                          .limit(params.get('limit')))
+
+
+def isoformat(time):
+    return None if time is None else time.isoformat()
+
+
+def couriers_items(rows):
+    """ Returns a `list` of couriers' `dict`s for `rows` of
+        `couriers_query` loading their regions and working hours.
+        Earnings and rating are included like in the courier's
+        profile, only if he has completed bundles.
+    """
+    courier_ids = [row.courier_id for row in rows]
+    regions = {courier_id: [] for courier_id in courier_ids}
+    periods = {courier_id: [] for courier_id in courier_ids}
+    for courier_id, region_id in db.session.execute(
+            select(CourierRegions.courier_id, CourierRegions.region_id)
+            .where(CourierRegions.courier_id.in_(courier_ids))
+            .order_by(CourierRegions.id)):
+        regions[courier_id].append(region_id)
+    for courier_id, start_minute, end_minute in db.session.execute(
+            select(WorkingHours.courier_id, WorkingHours.start_minute,
+                   WorkingHours.end_minute)
+            .where(WorkingHours.courier_id.in_(courier_ids))
+            .order_by(WorkingHours.id)):
+        periods[courier_id].append(minutes_period(start_minute, end_minute))
+
+    items = []
+    for row in rows:
+        item = {
+            'courier_id': row.courier_id,
+            'courier_type': row.courier_type,
+            'regions': regions[row.courier_id],
+            'working_hours': periods[row.courier_id]
+        }
+        if row.has_completed_bundles:
+            item['earnings'] = row.earnings
+            item['rating'] = row.rating
+        items.append(item)
+    return items
+
+
+def orders_items(rows):
+    """ Returns a `list` of orders' `dict`s for `rows` of
+        `orders_query` loading their delivery hours
+    """
+    order_ids = [row[0] for row in rows]
+    periods = {order_id: [] for order_id in order_ids}
+    hours = union_all(*[
+        select(table.c.id, table.c.order_id, table.c.start_minute,
+               table.c.end_minute)
+        .where(table.c.order_id.in_(order_ids))
+        for table in [DeliveryHours.__table__, delivery_hours_archive]
+    ]).subquery()
+    for _, order_id, start_minute, end_minute in db.session.execute(
+            select(hours).order_by(hours.c.id)):
+        periods[order_id].append(minutes_period(start_minute, end_minute))
+
+    items = []
+    # Rows are unpacked in the order of `ORDER_COLUMNS`
+    for (order_id, weight, region, assigned, completed, assigned_courier,
+         assign_time, complete_time, delivery_time) in rows:
+        if completed:
+            status = 'completed'
+        elif assigned:
+            status = 'assigned'
+        else:
+            status = 'unassigned'
+        items.append({
+            'order_id': order_id,
+            'weight': weight,
+            'region': region,
+            'delivery_hours': periods[order_id],
+            'status': status,
+            'assigned_courier': assigned_courier,
+            'assign_time': isoformat(assign_time),
+            'complete_time': isoformat(complete_time),
+            'delivery_time': delivery_time
+        })
+    return items
+
+
+def page(query, params, items, id_key):
+    """ Returns a page of at most `limit` from `params` `items` built
+        from rows of `query` and the cursor of the next page or `None`
+        if it's the last one. One extra row is read to find it out.
+    """
+    limit = params['limit']
+    rows = db.session.execute(query(dict(params, limit=limit + 1))).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = getattr(rows[-1], id_key)
+    return items(rows), next_cursor
+
+
+def export(query, items, chunk_size):
+    """ Yields NDJSON lines of all `items` built from rows of `query`
+        by chunks of `chunk_size` rows read from a server-side cursor
+    """
+    # Keys are sorted like in `jsonify` responses
+    encode = json.JSONEncoder(sort_keys=True).encode
+    result = db.session.execute(
+        query.execution_options(stream_results=True))
+    for rows in result.partitions(chunk_size):
+        yield ''.join(encode(item) + '\n' for item in items(rows))
+
+
+def list_response(args, name, filters, query, items, id_key):
+    """ Returns the response to a list request with query parameters
+        `args`: a page of `name` elements or NDJSON export of all of
+        them. `query` builds their `SELECT` from the parameters,
+        `items` converts its rows, `id_key` is the cursor column.
+    """
+    config = current_app.config
+    try:
+        params = parse_args(args, filters, config['LIST_MAX_PAGE_SIZE'])
+    except ValueError as error:
+        bad_request_msg = {
+            'Error': f'{error}'
+        }
+        return jsonify(bad_request_msg), 400
+
+    # Export isn't limited unless `limit` is received
+    if params.get('format') == 'ndjson':
+        lines = export(query(params), items, config['EXPORT_CHUNK_SIZE'])
+        # NGINX sends the lines as they are written instead of buffering
+        return Response(stream_with_context(lines),
+                        mimetype='application/x-ndjson',
+                        headers={'X-Accel-Buffering': 'no'})
+
+    params.setdefault('limit', config['LIST_PAGE_SIZE'])
+    elements, next_cursor = page(query, params, items, id_key)
+    return jsonify({name: elements, 'next_cursor': next_cursor}), 200
@@ -0,0 +1,172 @@
+""" Per-request instrumentation.
+
+    When enabled, every request records the number of SQL queries, time
+    spent in the database, rows returned by the queries and time spent
+    in Python. These values are returned in `X-DB-Queries`, `X-DB-Time`,
+    `X-DB-Rows` and `X-App-Time` response headers, logged in debug mode
+    and collected into per-route histograms exposed by `/metrics` in
+    Prometheus text format along with counters of other components
+    such as replays of retried requests. Every gunicorn worker collects its own
+    metrics. When disabled, no hooks are installed at all.
+"""
+import time
+from threading import Lock
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+""" Upper bounds of histograms' buckets """
+TIME_BUCKETS = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                1, 2.5, 5, 10]
+QUERIES_BUCKETS = [1, 2, 5, 10, 20, 50, 100, 200, 500]
+
+
+class Histogram:
+    """ Prometheus histogram with a series per labels `tuple` """
+
+    def __init__(self, name, description, label_names, buckets):
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+        self.buckets = buckets
+        # {labels: [bucket counts..., sum, count]}
+        self.series = {}
+
+    def observe(self, labels, value):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [0] * (len(self.buckets) + 2)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[i] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.description}',
+                 f'# TYPE {self.name} histogram']
+        for labels, series in sorted(self.series.items()):
+            names = ','.join(f'{name}="{value}"' for name, value
+                             in zip(self.label_names, labels))
+            for bound, count in zip(self.buckets, series):
+                lines.append(f'{self.name}_bucket{{{names},le="{bound}"}} '
+                             f'{count}')
+            lines.append(f'{self.name}_bucket{{{names},le="+Inf"}} '
+                         f'{series[-1]}')
+            lines.append(f'{self.name}_sum{{{names}}} {series[-2]}')
+            lines.append(f'{self.name}_count{{{names}}} {series[-1]}')
+        return lines
+
+
+class Metrics:
+    """ Histograms of requests by route, method and status
+        and counters added by other components
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        labels = ('route', 'method', 'status')
+        self.histograms = {
+            'duration': Histogram('candy_request_duration_seconds',
+                                  'Request processing time', labels,
+                                  TIME_BUCKETS),
+            'db_time': Histogram('candy_request_db_seconds',
+                                 'Time spent in SQL queries', labels,
+                                 TIME_BUCKETS),
+            'queries': Histogram('candy_request_db_queries',
+                                 'Number of SQL queries', labels,
+                                 QUERIES_BUCKETS),
+            'rows': Histogram('candy_request_db_rows',
+                              'Number of rows returned by SQL queries',
+                              labels, QUERIES_BUCKETS)
+        }
+        # [(name, description, function returning the value)]
+        self.counters = []
+
+    def add_counter(self, name, description, value):
+        """ Adds a counter whose current value is returned
+            by `value` function when metrics are rendered
+        """
+        self.counters.append((name, description, value))
+
+    def observe(self, labels, values):
+        with self.lock:
+            for name, value in values.items():
+                self.histograms[name].observe(labels, value)
+
+    def render(self):
+        with self.lock:
+            lines = []
+            for histogram in self.histograms.values():
+                lines.extend(histogram.render())
+        for name, description, value in self.counters:
+            lines.extend([f'# HELP {name} {description}',
+                          f'# TYPE {name} counter',
+                          f'{name} {value()}'])
+        return '\n'.join(lines) + '\n'
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context,
+                          executemany):
+    if has_request_context() and 'db_queries' in g:
+        g.query_start = time.perf_counter()
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context,
+                         executemany):
+    if has_request_context() and 'query_start' in g:
+        g.db_time += time.perf_counter() - g.query_start
+        g.db_queries += 1
+        # Rows of `SELECT` or `RETURNING`, drivers return -1 if unknown
+        if cursor.description is not None:
+            g.db_rows += max(cursor.rowcount, 0)
+        del g.query_start
+
+
+def init_metrics(app):
+    """ Installs instrumentation hooks into the `app` and
+        adds `/metrics` routing
+    """
+    metrics = Metrics()
+    event.listen(Engine, 'before_cursor_execute', before_cursor_execute)
+    event.listen(Engine, 'after_cursor_execute', after_cursor_execute)
+
+    @app.before_request
+    def start_request():
+        g.request_start = time.perf_counter()
+        g.db_queries = 0
+        g.db_time = 0
+        g.db_rows = 0
+
+    @app.after_request
+    def finish_request(response):
+        if 'request_start' not in g:
+            return response
+        duration = time.perf_counter() - g.request_start
+        response.headers['X-DB-Queries'] = str(g.db_queries)
+        response.headers['X-DB-Time'] = f'{g.db_time * 1000:.2f}ms'
+        response.headers['X-DB-Rows'] = str(g.db_rows)
+        response.headers['X-App-Time'] = \
+            f'{(duration - g.db_time) * 1000:.2f}ms'
+
+        route = request.url_rule.rule if request.url_rule else 'unknown'
+        if app.debug:
+            app.logger.debug(
+                'route=%s method=%s status=%s duration_ms=%.2f '
+                'db_queries=%s db_time_ms=%.2f db_rows=%s', route,
+                request.method, response.status_code, duration * 1000,
+                g.db_queries, g.db_time * 1000, g.db_rows)
+        metrics.observe((route, request.method, response.status_code), {
+            'duration': duration,
+            'db_time': g.db_time,
+            'queries': g.db_queries,
+            'rows': g.db_rows
+        })
+        return response
+
+    @app.route("/metrics")
+    def metrics_text():
+        return (metrics.render(), 200,
+                {'Content-Type': 'text/plain; version=0.0.4'})
+
+    return metrics
@@ -1,3 +1,4 @@
+from sqlalchemy.ext.associationproxy import association_proxy
 from app import db, ma
 
 
@@ -5,13 +6,33 @@ class Couriers(db.Model):
     __tablename__ = 'couriers'
     courier_id = db.Column(db.Integer, primary_key=True)
     courier_type = db.Column(db.String(8), nullable=False)
-    regions = db.Column(db.PickleType, nullable=False)
-    working_hours = db.Column(db.PickleType, nullable=False)
+    region_links = db.relationship('CourierRegions', lazy='selectin',
+                                   cascade='all, delete-orphan',
+                                   order_by='CourierRegions.id')
+    working_periods = db.relationship('WorkingHours', lazy='selectin',
+                                      cascade='all, delete-orphan',
+                                      order_by='WorkingHours.id')
+    regions = association_proxy(
+        'region_links', 'region_id',
+        creator=lambda region_id: CourierRegions(region_id=region_id))
+    working_hours = association_proxy(
+        'working_periods', 'period',
+        creator=lambda period: WorkingHours(period=period))
     earnings = db.Column(db.Integer, default=0)
     rating = db.Column(db.Float)
+    # Minimal average delivery time among courier's regions
+    min_avg_delivery_time = db.Column(db.Float)
     orders = db.relationship('Orders', backref='courier', lazy=True)
     bundles = db.relationship('OrdersBundle', backref='courier', lazy=True)
 
+    @property
+    def working_intervals(self):
+        """ Sorted `list` of courier's working hours
+            as `(start, end)` minutes of the day
+        """
+        return sorted((period.start_minute, period.end_minute)
+                      for period in self.working_periods)
+
     def __repr__(self):
         return (f'Couriers('
                 f'courier_id={self.courier_id}, '
@@ -23,12 +44,107 @@ class Couriers(db.Model):
         return f'<Courier id: {self.courier_id}>'
 
 
+class CourierRegions(db.Model):
+    __tablename__ = 'courier_regions'
+    __table_args__ = (
+        db.Index('ix_courier_regions_region_courier',
+                 'region_id', 'courier_id'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    courier_id = db.Column(db.Integer,
+                           db.ForeignKey('couriers.courier_id'),
+                           nullable=False, index=True)
+    region_id = db.Column(db.Integer, nullable=False)
+
+    def __repr__(self):
+        return (f'CourierRegions('
+                f'courier_id={self.courier_id}, '
+                f'region_id={self.region_id})')
+
+    def __str__(self):
+        return f'<Courier id: {self.courier_id}, Region: {self.region_id}>'
+
+
+def period_minutes(period):
+    """ Converts a time period `'HH:MM-HH:MM'` into a `tuple`
+        of its start and end minutes of the day.\n
+        Example: `'09:00-18:30'` -> `(540, 1110)`
+    """
+    start, end = period.split('-')
+    start_hours, start_minutes = start.split(':')
+    end_hours, end_minutes = end.split(':')
+    return (int(start_hours) * 60 + int(start_minutes),
+            int(end_hours) * 60 + int(end_minutes))
+
+
+def minutes_period(start_minute, end_minute):
+    """ Converts start and end minutes of the day into a time
+        period `'HH:MM-HH:MM'`, the reverse of `period_minutes`.\n
+        Example: `(540, 1110)` -> `'09:00-18:30'`
+    """
+    return (f'{start_minute // 60:02d}:{start_minute % 60:02d}'
+            f'-{end_minute // 60:02d}:{end_minute % 60:02d}')
+
+
+class TimePeriod:
+    """ Mixin for time periods tables. A period received in
+        `'HH:MM-HH:MM'` format is stored as minutes of the day
+        of its start and end, so the database can compare them.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    start_minute = db.Column(db.Integer, nullable=False)
+    end_minute = db.Column(db.Integer, nullable=False)
+
+    @property
+    def period(self):
+        return minutes_period(self.start_minute, self.end_minute)
+
+    @period.setter
+    def period(self, value):
+        self.start_minute, self.end_minute = period_minutes(value)
+
+    def __repr__(self):
+        return f'{type(self).__name__}(period="{self.period}")'
+
+    def __str__(self):
+        return self.period
+
+
+class WorkingHours(TimePeriod, db.Model):
+    __tablename__ = 'working_hours'
+    courier_id = db.Column(db.Integer,
+                           db.ForeignKey('couriers.courier_id'),
+                           nullable=False, index=True)
+
+
+class DeliveryHours(TimePeriod, db.Model):
+    __tablename__ = 'delivery_hours'
+    order_id = db.Column(db.Integer,
+                         db.ForeignKey('orders.order_id'),
+                         nullable=False, index=True)
+
+
 class Orders(db.Model):
     __tablename__ = 'orders'
+    __table_args__ = (
+        # Candidates lookup for `/orders/assign`: region and weight
+        # of the orders which are still available for assignment
+        db.Index('ix_orders_unassigned_region_weight', 'region', 'weight',
+                 postgresql_where=db.text('NOT assigned')),
+        # Courier's orders which are not completed yet
+        db.Index('ix_orders_courier_open', 'assigned_courier',
+                 postgresql_where=db.text('NOT completed')),
+        db.Index('ix_orders_bundle', 'bundle'),
+    )
     order_id = db.Column(db.Integer, primary_key=True)
     weight = db.Column(db.Float(precision=2), nullable=False)
     region = db.Column(db.Integer, nullable=False)
-    delivery_hours = db.Column(db.PickleType, nullable=False)
+    delivery_periods = db.relationship('DeliveryHours', lazy='selectin',
+                                       cascade='all, delete-orphan',
+                                       order_by='DeliveryHours.id')
+    delivery_hours = association_proxy(
+        'delivery_periods', 'period',
+        creator=lambda period: DeliveryHours(period=period))
     assigned_courier = db.Column(db.Integer,
                                  db.ForeignKey('couriers.courier_id'))
     assigned = db.Column(db.Boolean, default=False)
@@ -39,6 +155,14 @@ class Orders(db.Model):
     complete_time = db.Column(db.DateTime(timezone=True))
     delivery_time = db.Column(db.Float(precision=2))
 
+    @property
+    def delivery_intervals(self):
+        """ Sorted `list` of order's delivery hours
+            as `(start, end)` minutes of the day
+        """
+        return sorted((period.start_minute, period.end_minute)
+                      for period in self.delivery_periods)
+
     def __repr__(self):
         return (f'Orders('
                 f'order_id={self.order_id}, '
@@ -51,6 +175,10 @@ class Orders(db.Model):
 
 
 class OrdersBundle(db.Model):
+    __table_args__ = (
+        db.Index('ix_orders_bundle_courier_completed',
+                 'courier_id', 'completed'),
+    )
     bundle_id = db.Column(db.Integer, primary_key=True)
     orders = db.relationship('Orders', backref='bundle_id', lazy=True)
     courier_id = db.Column(db.Integer,
@@ -60,6 +188,14 @@ class OrdersBundle(db.Model):
     completed = db.Column(db.Boolean, default=False)
     complete_time = db.Column(db.DateTime(timezone=True))
     deleted = db.Column(db.Boolean, default=False)
+    # Number of bundle's orders which are not completed yet
+    # and completion time of the latest delivered order
+    open_orders = db.Column(db.Integer, nullable=False, default=0)
+    last_complete_time = db.Column(db.DateTime(timezone=True))
+    # Orders matched to the courier in push mode which he hasn't
+    # requested yet, their assign time is set by `/orders/assign`
+    pending = db.Column(db.Boolean, nullable=False, default=False,
+                        server_default=db.false())
 
     def __repr__(self):
         return (f'OrdersBundle('
@@ -73,12 +209,17 @@ class OrdersBundle(db.Model):
 
 
 class Regions(db.Model):
+    __table_args__ = (
+        db.Index('ix_regions_courier_region', 'courier_id', 'region_id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     region_id = db.Column(db.Integer, nullable=False)
     courier_id = db.Column(db.Integer,
                            db.ForeignKey('couriers.courier_id'))
     avg_delivery_time = db.Column(db.Float(precision=2),
                                   nullable=False)
+    delivery_time_sum = db.Column(db.Float, nullable=False, default=0)
+    orders_count = db.Column(db.Integer, nullable=False, default=0)
 
     def __repr__(self):
         return (f'Regions('
@@ -90,3 +231,55 @@ class Regions(db.Model):
         return (f'Region: {self.region_id}, '
                 f'Courier: {self.courier_id}, '
                 f'Average delivery time: {self.avg_delivery_time}')
+
+
+class IdempotencyKeys(db.Model):
+    """ Responses saved for requests retried with the same
+        `Idempotency-Key` header, see `app.idempotency`
+    """
+    __tablename__ = 'idempotency_keys'
+    route = db.Column(db.String(64), primary_key=True)
+    key = db.Column(db.String(255), primary_key=True)
+    # SHA-256 of the request body the response was returned for
+    fingerprint = db.Column(db.String(64), nullable=False)
+    status = db.Column(db.Integer, nullable=False)
+    content_type = db.Column(db.String(64), nullable=False)
+    body = db.Column(db.Text, nullable=False)
+    created = db.Column(db.DateTime(timezone=True), nullable=False,
+                        index=True)
+
+    def __repr__(self):
+        return (f'IdempotencyKeys('
+                f'route="{self.route}", '
+                f'key="{self.key}", '
+                f'status={self.status})')
+
+
+def archive_table(table, *indexes):
+    """ Creates `<name>_archive` table with the columns of `table`
+        for rows moved out of it by `app.archive`. Archive tables have
+        no foreign keys, defaults or sequences, their rows are copied
+        as they are. `indexes` are `(name, columns)` pairs.
+    """
+    archive = db.Table(f'{table.name}_archive', db.metadata,
+                       *[db.Column(column.name, column.type,
+                                   primary_key=column.primary_key,
+                                   nullable=column.nullable,
+                                   autoincrement=False)
+                         for column in table.columns])
+    for name, columns in indexes:
+        db.Index(name, *[archive.c[column] for column in columns])
+    return archive
+
+
+# Completed bundles with their orders and orders' delivery hours
+orders_bundle_archive = archive_table(
+    OrdersBundle.__table__,
+    ('ix_orders_bundle_archive_courier_id', ['courier_id']))
+orders_archive = archive_table(
+    Orders.__table__,
+    ('ix_orders_archive_assigned_courier', ['assigned_courier']),
+    ('ix_orders_archive_bundle', ['bundle']))
+delivery_hours_archive = archive_table(
+    DeliveryHours.__table__,
+    ('ix_delivery_hours_archive_order_id', ['order_id']))
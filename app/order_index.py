@@ -0,0 +1,105 @@
+""" In-process index of orders available for assignment.
+
+    Orders are kept by region in buckets of delivery hours (one bucket
+    per hour of the day an order may be delivered in) sorted by weight,
+    so candidates for a courier are found without querying the database.
+    The index is only a hint: the database still checks the orders
+    when they are claimed, so an outdated index can't cause a wrong
+    assignment, though it may miss orders changed by other workers
+    until it is rebuilt.
+"""
+import bisect
+import time
+from threading import Lock
+
+
+def hour_slots(ranges):
+    """ Returns a `set` of hours of the day covered by `ranges`
+        (`(start, end)` minutes with inclusive bounds)
+    """
+    slots = set()
+    for start, end in ranges:
+        slots.update(range(start // 60, end // 60 + 1))
+    return slots
+
+
+class OrderIndex:
+    """ Index of orders available for assignment. It is rebuilt from
+        the database when it's older than `ttl` seconds, `enabled`
+        equal to `False` turns it off.
+    """
+
+    def __init__(self, enabled, ttl):
+        self.enabled = enabled
+        self.ttl = ttl
+        self.lock = Lock()
+        self.built_at = None
+        # {region: {hour: [(weight, order_id), ...]}}
+        self.regions = {}
+        # {order_id: (region, weight, delivery ranges)}
+        self.orders = {}
+
+    def expired(self):
+        return self.built_at is None or \
+            self.built_at + self.ttl < time.monotonic()
+
+    def rebuild(self, orders):
+        """ Replaces the index content with `orders`: an iterable
+            of `(order_id, region, weight, delivery ranges)`
+        """
+        index = OrderIndex(self.enabled, self.ttl)
+        for order in orders:
+            index.add(*order)
+        with self.lock:
+            self.regions = index.regions
+            self.orders = index.orders
+            self.built_at = time.monotonic()
+
+    def add(self, order_id, region, weight, ranges):
+        """ Adds the order available for assignment, `ranges` are its
+            delivery hours as sorted `(start, end)` minutes
+        """
+        with self.lock:
+            if order_id in self.orders:
+                return
+            self.orders[order_id] = (region, weight, ranges)
+            buckets = self.regions.setdefault(region, {})
+            for slot in hour_slots(ranges):
+                bisect.insort(buckets.setdefault(slot, []),
+                              (weight, order_id))
+
+    def remove(self, order_id):
+        """ Removes the order which is not available anymore """
+        with self.lock:
+            order = self.orders.pop(order_id, None)
+            if order is None:
+                return
+            region, weight, ranges = order
+            buckets = self.regions[region]
+            for slot in hour_slots(ranges):
+                bucket = buckets[slot]
+                del bucket[bisect.bisect_left(bucket, (weight, order_id))]
+                if len(bucket) == 0:
+                    del buckets[slot]
+
+    def candidates(self, regions, capacity, working_ranges):
+        """ Returns a `dict` of delivery ranges by ids of orders located
+            in `regions`, not heavier than `capacity` and deliverable
+            in the same hours as `working_ranges`. Orders delivered
+            in the same hours don't necessarily intersect the working
+            ranges, it should be checked by the caller.
+        """
+        slots = hour_slots(working_ranges)
+        found = {}
+        with self.lock:
+            for region in regions:
+                buckets = self.regions.get(region)
+                if buckets is None:
+                    continue
+                for slot in slots:
+                    bucket = buckets.get(slot, [])
+                    end = bisect.bisect_right(bucket,
+                                              (capacity, float('inf')))
+                    for weight, order_id in bucket[:end]:
+                        found[order_id] = self.orders[order_id][2]
+        return found
@@ -0,0 +1,90 @@
+""" Read-only records for responses.
+
+    Responses of the busiest routings are built from column-only
+    queries instead of model instances: selected columns are copied
+    into `namedtuple` records, which aren't tracked by the session,
+    don't load relationships and are cheap to create. Records are
+    snapshots and aren't updated by later changes of the session,
+    data is changed through the models only.
+"""
+from collections import namedtuple
+from sqlalchemy import or_, select
+from app import db
+from app.models import (CourierRegions, Couriers, Orders, OrdersBundle,
+                        WorkingHours, minutes_period, orders_bundle_archive)
+
+CourierRecord = namedtuple('CourierRecord', [
+    'courier_id', 'courier_type', 'regions', 'working_hours', 'earnings',
+    'rating', 'has_completed_bundles'
+])
+OrderRecord = namedtuple('OrderRecord', [
+    'order_id', 'assigned_courier', 'assign_time'
+])
+
+
+def completed_bundles_exist():
+    """ Returns a condition which is true for couriers who have at least
+        one completed bundle which isn't deleted, working or archived.
+        Their earnings and rating are shown in responses.
+    """
+    return or_(
+        select(OrdersBundle.bundle_id)
+        .where(OrdersBundle.courier_id == Couriers.courier_id,
+               OrdersBundle.completed, ~OrdersBundle.deleted)
+        .exists(),
+        # Archived bundles are completed
+        select(orders_bundle_archive.c.bundle_id)
+        .where(orders_bundle_archive.c.courier_id == Couriers.courier_id,
+               ~orders_bundle_archive.c.deleted)
+        .exists())
+
+
+def courier_record(courier_id):
+    """ Returns `CourierRecord` of the courier or `None` if there is
+        no such courier. Regions and working hours are lists in the
+        order they were set, working hours as `'HH:MM-HH:MM'` periods.
+        Courier, his regions and working hours and the completed
+        bundle check are loaded with a single query.
+    """
+    query = (select(Couriers.courier_id, Couriers.courier_type,
+                    Couriers.earnings, Couriers.rating,
+                    completed_bundles_exist(),
+                    CourierRegions.id, CourierRegions.region_id,
+                    WorkingHours.id, WorkingHours.start_minute,
+                    WorkingHours.end_minute)
+             .outerjoin(CourierRegions,
+                        CourierRegions.courier_id == Couriers.courier_id)
+             .outerjoin(WorkingHours,
+                        WorkingHours.courier_id == Couriers.courier_id)
+             .where(Couriers.courier_id == courier_id)
+             .order_by(CourierRegions.id, WorkingHours.id))
+    rows = db.session.execute(query).all()
+    if len(rows) == 0:
+        return None
+
+    # Every region is joined with every working period,
+    # duplicates are dropped keeping the first occurrence
+    regions = {}
+    periods = {}
+    for row in rows:
+        if row[5] is not None:
+            regions.setdefault(row[5], row[6])
+        if row[7] is not None:
+            periods.setdefault(row[7], minutes_period(row[8], row[9]))
+    courier_id, courier_type, earnings, rating, has_completed_bundles = \
+        rows[0][:5]
+    return CourierRecord(courier_id, courier_type, list(regions.values()),
+                         list(periods.values()), earnings, rating,
+                         has_completed_bundles)
+
+
+def open_orders(courier_ids):
+    """ Returns a `list` of `OrderRecord`s of assigned and not
+        completed orders of couriers from `courier_ids` sorted by id
+    """
+    query = (select(Orders.order_id, Orders.assigned_courier,
+                    Orders.assign_time)
+             .where(Orders.assigned_courier.in_(courier_ids),
+                    ~Orders.completed)
+             .order_by(Orders.order_id))
+    return [OrderRecord(*row) for row in db.session.execute(query)]
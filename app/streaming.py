@@ -0,0 +1,150 @@
+""" Incremental JSON parsing of large import payloads.
+
+    `iter_items` reads a request body chunk by chunk and yields
+    elements of the array stored under the given key of the top-level
+    JSON object one by one, so the memory consumed doesn't depend
+    on the payload size.\n
+    Objects with duplicate keys are rejected: a streamed value can't be
+    replaced by a later one like `json.loads` does. Small payloads are
+    parsed by `loads` with the same rule, so an import doesn't depend
+    on the payload size.
+"""
+import codecs
+import json
+
+""" Maximal size of a single JSON value in characters """
+MAX_ELEMENT_SIZE = 1024 * 1024
+
+WHITESPACE = ' \t\n\r'
+
+
+def unique_object(pairs):
+    """ `object_pairs_hook` of JSON decoding which raises `ValueError`
+        if the object has duplicate keys
+    """
+    obj = dict(pairs)
+    if len(obj) != len(pairs):
+        raise ValueError('Duplicate keys in JSON object')
+    return obj
+
+
+def loads(data):
+    """ Parses JSON `data` rejecting duplicate keys """
+    return json.loads(data, object_pairs_hook=unique_object)
+
+
+class JSONStream:
+    """ Reader of JSON values from a binary `stream` """
+
+    decoder = json.JSONDecoder(object_pairs_hook=unique_object)
+
+    def __init__(self, stream, chunk_size):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.utf8 = codecs.getincrementaldecoder('utf-8')()
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    def read(self):
+        """ Appends the next chunk of the stream to the buffer
+            dropping the already parsed part of it
+        """
+        chunk = self.stream.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+        text = self.utf8.decode(chunk, final=self.eof)
+        self.buffer = self.buffer[self.pos:] + text
+        self.pos = 0
+        if len(self.buffer) > MAX_ELEMENT_SIZE:
+            raise ValueError('JSON value is too large')
+
+    def peek(self):
+        """ Returns the next non-whitespace character
+            or an empty string at the end of the stream
+        """
+        while True:
+            while self.pos < len(self.buffer) and \
+                    self.buffer[self.pos] in WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if self.eof:
+                return ''
+            self.read()
+
+    def expect(self, *chars):
+        """ Consumes the next non-whitespace character and returns it
+            if it is one of the `chars`, raises `ValueError` otherwise
+        """
+        char = self.peek()
+        if char == '' or char not in chars:
+            raise ValueError(f'Expecting one of {chars} at "{char}"')
+        self.pos += 1
+        return char
+
+    def delimited(self, pos):
+        """ Checks whether a value ending at `pos` is followed
+            by a delimiter, so it can't be continued by the next chunk
+        """
+        while pos < len(self.buffer) and self.buffer[pos] in WHITESPACE:
+            pos += 1
+        return pos < len(self.buffer) and self.buffer[pos] in ',:]}'
+
+    def value(self):
+        """ Parses and returns the next JSON value """
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+                # A number at the end of the buffer may be cut by the chunk
+                if self.eof or self.delimited(end):
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self.read()
+
+
+def iter_items(stream, key, chunk_size=64 * 1024):
+    """ Yields elements of the array stored under `key` of the top-level
+        JSON object read from the binary `stream`. The rest of the object
+        is parsed after the array, so a truncated body or data after
+        the object are rejected like by `loads`. Raises `KeyError`
+        if there is no such key and `ValueError` if JSON is malformed
+        or has duplicate keys.\n
+        Example: `iter_items(request.stream, 'data')`
+    """
+    parser = JSONStream(stream, chunk_size)
+    parser.expect('{')
+    names = set()
+    if parser.peek() == '}':
+        parser.pos += 1
+    else:
+        while True:
+            name = parser.value()
+            if not isinstance(name, str):
+                raise ValueError('Object keys should be strings')
+            if name in names:
+                raise ValueError(f'Duplicate key "{name}"')
+            names.add(name)
+            parser.expect(':')
+            if name == key:
+                parser.expect('[')
+                if parser.peek() == ']':
+                    parser.pos += 1
+                else:
+                    while True:
+                        yield parser.value()
+                        if parser.expect(',', ']') == ']':
+                            break
+            else:
+                parser.value()
+            if parser.expect(',', '}') == '}':
+                break
+
+    if parser.peek() != '':
+        raise ValueError('Extra data after JSON object')
+    if key not in names:
+        raise KeyError(key)
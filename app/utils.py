@@ -1,9 +1,12 @@
 import pytz
-from datetime import date, datetime, timedelta
-from datetimerange import DateTimeRange
-from itertools import product
-from app import db
-from app.models import Couriers, Orders, OrdersBundle, Regions
+from datetime import datetime, timedelta
+from itertools import islice
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import lazyload
+from app import assignment, db, order_index, records, streaming
+from app.models import (CourierRegions, Couriers, DeliveryHours, Orders,
+                        OrdersBundle, Regions, WorkingHours, period_minutes)
+from app.order_index import hour_slots
 
 
 def validation_error(invalid_ids, errors):
@@ -31,49 +34,172 @@ def validation_error(invalid_ids, errors):
     return bad_request
 
 
-def creation_success(data, data_type):
+def creation_success(ids, data_type):
     """ Message that will be returned for `'POST'`
         routings in case of successful database entry. \n
         Example:\n
         `{"couriers": [{"id": 1}, {"id": 2}]}`
     """
-    if data_type == 'couriers':
-        id_type = 'courier_id'
-    elif data_type == 'orders':
-        id_type = 'order_id'
-
     success_msg = {data_type: []}
-    for element in data['data']:
-        success_msg[data_type].append({'id': element[id_type]})
+    for element_id in ids:
+        success_msg[data_type].append({'id': element_id})
 
     return success_msg
 
 
-def datetime_ranges(time_ranges):
-    """ This functions takes a `list` of time ranges presented
-        as `string`s in the following format: `'HH:MM'`,
-        converts them into `DateTimeRange` objects and returns
-        a `list` of these objects
+def data_chunks(request, chunk_size, stream_min_size):
+    """ Yields `list`s of at most `chunk_size` elements of `'data'`
+        array received in `'POST'` request. Requests larger than
+        `stream_min_size` bytes or of unknown length are parsed
+        incrementally from the input stream, so the whole payload
+        is never held in memory. Both ways reject duplicate keys.\n
+        Raises `KeyError` if there is no `'data'` key and
+        `ValueError` if JSON is malformed or has duplicate keys.
+    """
+    if request.content_length is not None and \
+            request.content_length <= stream_min_size:
+        elements = iter(streaming.loads(request.get_data())['data'])
+    else:
+        elements = streaming.iter_items(request.stream, 'data')
+
+    chunk = list(islice(elements, chunk_size))
+    while len(chunk) != 0:
+        yield chunk
+        chunk = list(islice(elements, chunk_size))
+
+
+def check_elements(elements, valid_keys, validator, id_column, seen_ids,
+                   archive_column=None):
+    """ Validates a chunk of couriers or orders received in `'POST'`
+        request with the `validator` and checks that their ids are not
+        present in the database, including the archive table's
+        `archive_column`, or among previously received ids
+        `seen_ids`, which is updated with ids of valid elements.\n
+        Returns a `tuple` of valid elements, invalid ids and errors.
     """
-    output_dt_ranges = []
-    for time_range in time_ranges:
+    id_key = id_column.key
+    existing = existing_ids(id_column, elements, id_key, archive_column)
+    valid_elements = []
+    invalid_ids = []
+    errors = []
+
+    for element in elements:
+        keys_list = list(element.keys())
+        keys_list.sort()
+        if keys_list != valid_keys:
+            invalid_ids.append(element[id_key])
+            errors.append({
+                f"id {element[id_key]}": 'Incorrect properties'
+            })
+            continue
+
+        # Validation of data contained in received JSON via schema
+        validation_errors = validator.validate(element)
+        if len(validation_errors) != 0:
+            invalid_ids.append(element[id_key])
+            errors.append({f"id {element[id_key]}": str(validation_errors)})
+        elif element[id_key] in existing or element[id_key] in seen_ids:
+            invalid_ids.append(element[id_key])
+            errors.append({f"id {element[id_key]}": 'id already exists'})
+        else:
+            seen_ids.add(element[id_key])
+            valid_elements.append(element)
 
-        range_list = time_range.split('-')
-        range_start = datetime.strptime(range_list[0], '%H:%M').time()
-        range_end = datetime.strptime(range_list[1], '%H:%M').time()
+    return valid_elements, invalid_ids, errors
 
-        today = date.today()
-        range_start_dt = datetime.combine(today, range_start)
-        range_end_dt = datetime.combine(today, range_end)
-        output_range = DateTimeRange(range_start_dt, range_end_dt)
-        output_dt_ranges.append(output_range)
 
-    return output_dt_ranges
+def existing_ids(id_column, elements, id_key, archive_column=None):
+    """ Returns a `set` of ids from received `elements` which are
+        already present in the database. All the ids are checked
+        with a single query against the primary key `id_column`
+        and the primary key of its archive table `archive_column`.\n
+        Example: `existing_ids(Couriers.courier_id, data, 'courier_id')`
+    """
+    ids = {element[id_key] for element in elements
+           if isinstance(element, dict) and type(element.get(id_key)) == int}
+    if len(ids) == 0:
+        return set()
+    query = db.session.query(id_column).filter(id_column.in_(ids))
+    if archive_column is not None:
+        query = query.union_all(
+            db.session.query(archive_column).filter(archive_column.in_(ids)))
+    return {row[0] for row in query}
+
+
+def insert_couriers(couriers):
+    """ Inserts validated couriers received as `dict`s together
+        with their regions and working hours. Each table is filled
+        with a single multi-row `INSERT` statement.
+    """
+    if len(couriers) == 0:
+        return
+    regions = []
+    working_hours = []
+    for courier in couriers:
+        for region_id in courier['regions']:
+            regions.append({'courier_id': courier['courier_id'],
+                            'region_id': region_id})
+        for period in courier['working_hours']:
+            start_minute, end_minute = period_minutes(period)
+            working_hours.append({'courier_id': courier['courier_id'],
+                                  'start_minute': start_minute,
+                                  'end_minute': end_minute})
+
+    db.session.execute(Couriers.__table__.insert(),
+                       [{'courier_id': courier['courier_id'],
+                         'courier_type': courier['courier_type']}
+                        for courier in couriers])
+    db.session.execute(CourierRegions.__table__.insert(), regions)
+    db.session.execute(WorkingHours.__table__.insert(), working_hours)
+
+
+def insert_orders(orders):
+    """ Inserts validated orders received as `dict`s together
+        with their delivery hours. Each table is filled with
+        a single multi-row `INSERT` statement.
+    """
+    if len(orders) == 0:
+        return
+    delivery_hours = []
+    for order in orders:
+        for period in order['delivery_hours']:
+            start_minute, end_minute = period_minutes(period)
+            delivery_hours.append({'order_id': order['order_id'],
+                                   'start_minute': start_minute,
+                                   'end_minute': end_minute})
+
+    db.session.execute(Orders.__table__.insert(),
+                       [{'order_id': order['order_id'],
+                         'weight': round(order['weight'], 2),
+                         'region': order['region']}
+                        for order in orders])
+    db.session.execute(DeliveryHours.__table__.insert(), delivery_hours)
+
+
+def ranges_intersect(first_ranges, second_ranges):
+    """ Checks whether any range from `first_ranges` intersects
+        any range from `second_ranges`. Both arguments are sorted
+        `list`s of `(start, end)` minutes tuples, ranges bounds
+        are inclusive. The lists are merged in a single pass:
+        the range which ends earlier can't intersect any of
+        the following ranges of the other list and is skipped.
+    """
+    i = j = 0
+    while i < len(first_ranges) and j < len(second_ranges):
+        first_start, first_end = first_ranges[i]
+        second_start, second_end = second_ranges[j]
+        if first_start <= second_end and second_start <= first_end:
+            return True
+        if first_end < second_end:
+            i += 1
+        else:
+            j += 1
+    return False
 
 
 def assigned_orders_msg(assigned_orders, assign_time=None):
-    """ This function takes a `list` of `Orders` objects
-    assigned to the courier and their assign time in as
+    """ This function takes a `list` of `Orders` objects or
+    `OrderRecord`s assigned to the courier and their assign time in as
     a `datetime` object. Output is a dictionary of assigned
     orders in the following format:\n
     `{"orders": [{"id": 1}, {"id": 2}],`\n
@@ -97,114 +223,405 @@ def assigned_orders_msg(assigned_orders, assign_time=None):
     return orders_msg
 
 
-def regions_upd(new_regions, courier_id):
-    """This function takes a `list` of update courier's
-    regions and courier's id to check whether his assigned
-    orders comply with new regions list and makes them
-    available for assignment if not.
+def courier_profile(courier_id):
+    """ Returns courier's information as a `dict` for `'GET'` routing
+        or `None` if there is no such courier. Courier's earnings and
+        rating are included only if he has at least one completed
+        bundle of orders. The profile is built from `CourierRecord`
+        loaded with a single column-only query.
     """
-    orders = Orders.query.filter_by(assigned_courier=courier_id,
-                                    completed=False)
-    for order in orders:
-        if order.region not in new_regions:
-            order.assigned_courier = None
-            order.assign_time = None
-            order.assigned = False
-            order.bundle = None
-    db.session.commit()
-    upd_bundle_check(courier_id)
+    courier = records.courier_record(courier_id)
+    if courier is None:
+        return None
+
+    profile = {
+        'courier_id': courier.courier_id,
+        'courier_type': courier.courier_type,
+        'regions': courier.regions,
+        'working_hours': courier.working_hours
+    }
+    if courier.has_completed_bundles:
+        profile['earnings'] = courier.earnings
+        profile['rating'] = courier.rating
 
-    return
+    return profile
 
 
-def courier_type_upd(new_type, courier_id):
-    """This function takes a `list` of updated courier's
-    type and courier's id to check whether his assigned
-    orders comply with load capabilities and makes them
-    available for assignment if not.
+def locked_courier(courier_id):
+    """ Returns `Couriers` object locking his row until the end
+        of the transaction, so concurrent requests changing the
+        same courier and his orders are executed one by one.
+        Returns `None` if there is no such courier.
     """
-    orders = Orders.query.filter_by(assigned_courier=courier_id,
-                                    completed=False)
-    current_load = 0
-    for order in orders:
-        if CAPACITY[new_type] >= current_load + order.weight:
-            current_load += order.weight
-        else:
-            order.assigned_courier = None
-            order.assign_time = None
-            order.assigned = False
-            order.bundle = None
-    db.session.commit()
-    upd_bundle_check(courier_id)
+    return (Couriers.query.filter_by(courier_id=courier_id)
+                          .with_for_update(of=Couriers)
+                          .first())
 
-    return
+
+def locked_couriers(courier_ids):
+    """ Returns a `dict` of `Couriers` objects by their ids locking
+        their rows like `locked_courier` does. Rows are locked in
+        the order of ids, so concurrent batches don't deadlock.
+    """
+    couriers = (Couriers.query.filter(Couriers.courier_id.in_(courier_ids))
+                              .order_by(Couriers.courier_id)
+                              .with_for_update(of=Couriers)
+                              .all())
+    return {courier.courier_id: courier for courier in couriers}
 
 
-def working_hours_upd(new_hours, courier_id):
-    """This function takes a `list` of updated courier's
-    working hours and courier's id to check whether his
-    assigned orders comply with new hours and makes them
-    available for assignment if not.
+def delivered_in_hours(working_ranges):
+    """ Returns SQL condition which is true for orders whose
+        delivery hours intersect courier's `working_ranges`
+        (sorted `list` of `(start, end)` minutes)
     """
-    courier_ranges = datetime_ranges(new_hours)
-    orders = Orders.query.filter_by(assigned_courier=courier_id,
-                                    completed=False)
-    for order in orders:
-        reassign = True
-        order_ranges = datetime_ranges(order.delivery_hours)
-        for c_range, o_range in product(courier_ranges, order_ranges):
-            if c_range.is_intersection(o_range):
-                reassign = False
-                break
-        if reassign:
-            order.assigned_courier = None
-            order.assign_time = None
-            order.assigned = False
-            order.bundle = None
-    db.session.commit()
-    upd_bundle_check(courier_id)
+    hours_intersect = or_(*[and_(DeliveryHours.start_minute <= end,
+                                 DeliveryHours.end_minute >= start)
+                            for start, end in working_ranges])
+    return (db.session.query(DeliveryHours.id)
+                      .filter(DeliveryHours.order_id == Orders.order_id,
+                              hours_intersect)
+                      .exists())
+
+
+def candidate_orders(regions, capacity, working_ranges, limit):
+    """ Returns a `list` of at most `limit` orders available for
+        assignment to the courier: not assigned yet, located in one
+        of his `regions`, not heavier than his load `capacity` and
+        with delivery hours intersecting his `working_ranges` (sorted
+        `list` of `(start, end)` minutes). These predicates are served
+        by the partial index on unassigned orders or by `order_index`
+        if it's enabled.\n
+        Orders are locked with `FOR UPDATE SKIP LOCKED`: candidates of
+        a concurrent assignment are skipped and returned ones can't be
+        assigned by other requests until the transaction ends.
+    """
+    if order_index.enabled:
+        conditions = [Orders.order_id.in_(indexed_orders(
+            regions, capacity, working_ranges, limit))]
+    else:
+        conditions = [Orders.region.in_(regions),
+                      Orders.weight <= capacity,
+                      delivered_in_hours(working_ranges)]
+    return (Orders.query.filter(~Orders.assigned, *conditions)
+                        .options(lazyload(Orders.delivery_periods))
+                        .order_by(Orders.order_id)
+                        .limit(limit)
+                        .with_for_update(skip_locked=True, of=Orders)
+                        .all())
+
+
+def candidate_pool(couriers, limit):
+    """ Returns a `list` of orders available for assignment to any of
+        the `couriers`, at most `limit` orders per courier. Orders are
+        locked the same way `candidate_orders` does it.
+    """
+    if order_index.enabled:
+        order_ids = set()
+        for courier in couriers:
+            order_ids.update(indexed_orders(
+                courier.regions, CAPACITY[courier.courier_type],
+                courier.working_intervals, limit))
+        conditions = [Orders.order_id.in_(order_ids)]
+    else:
+        regions = set()
+        working_ranges = []
+        capacity = 0
+        for courier in couriers:
+            regions.update(courier.regions)
+            working_ranges.extend(courier.working_intervals)
+            capacity = max(capacity, CAPACITY[courier.courier_type])
+        conditions = [Orders.region.in_(regions),
+                      Orders.weight <= capacity,
+                      delivered_in_hours(sorted(working_ranges))]
+
+    return (Orders.query.filter(~Orders.assigned, *conditions)
+                        .order_by(Orders.order_id)
+                        .limit(limit * len(couriers))
+                        .with_for_update(skip_locked=True, of=Orders)
+                        .all())
+
+
+def open_orders_ranges(order_ids=None):
+    """ Yields `(order_id, region, weight, delivery ranges)` of orders
+        available for assignment, all of them or only the ones from
+        `order_ids`. Delivery ranges are sorted `(start, end)` minutes.
+    """
+    query = (db.session.query(Orders.order_id, Orders.region, Orders.weight,
+                              DeliveryHours.start_minute,
+                              DeliveryHours.end_minute)
+                       .join(DeliveryHours,
+                             DeliveryHours.order_id == Orders.order_id)
+                       .filter(~Orders.assigned))
+    if order_ids is not None:
+        query = query.filter(Orders.order_id.in_(order_ids))
+    query = query.order_by(Orders.order_id, DeliveryHours.start_minute,
+                           DeliveryHours.end_minute)
+
+    order = None
+    for order_id, region, weight, start_minute, end_minute in query:
+        if order is None or order[0] != order_id:
+            if order is not None:
+                yield order
+            order = (order_id, region, weight, [])
+        order[3].append((start_minute, end_minute))
+    if order is not None:
+        yield order
+
+
+def indexed_orders(regions, capacity, working_ranges, limit):
+    """ Returns a sorted `list` of at most `limit` ids of orders from
+        `order_index` satisfying the same conditions as orders returned
+        by `candidate_orders`. The index is rebuilt if it's expired.
+    """
+    if order_index.expired():
+        order_index.rebuild(open_orders_ranges())
+    candidates = order_index.candidates(regions, capacity, working_ranges)
+    order_ids = sorted(order_id for order_id, delivery_ranges
+                       in candidates.items()
+                       if ranges_intersect(working_ranges, delivery_ranges))
+    return order_ids[:limit]
+
+
+def index_orders(order_ids):
+    """ Adds orders which became available for assignment
+        to `order_index`. Should be called after commit.
+    """
+    if order_index.enabled and not order_index.expired():
+        for order in open_orders_ranges(order_ids):
+            order_index.add(*order)
+
+
+def unindex_orders(orders):
+    """ Removes assigned orders (`Orders` objects or `OrderRecord`s)
+        from `order_index`
+    """
+    if order_index.enabled:
+        for order in orders:
+            order_index.remove(order.order_id)
 
-    return
+
+def eligible_orders(couriers, orders):
+    """ Returns a `dict` of orders from `orders` which each courier
+        from `couriers` is able to deliver by courier id: orders in
+        his regions, not heavier than his load capacity and with
+        delivery hours intersecting his working hours.
+    """
+    delivery_ranges = {order.order_id: order.delivery_intervals
+                       for order in orders}
+    candidates = {}
+    for courier in couriers:
+        regions = set(courier.regions)
+        capacity = CAPACITY[courier.courier_type]
+        working_ranges = courier.working_intervals
+        candidates[courier.courier_id] = [
+            order for order in orders
+            if order.region in regions and order.weight <= capacity and
+            ranges_intersect(working_ranges, delivery_ranges[order.order_id])
+        ]
+    return candidates
+
+
+def create_bundles(assignments, assign_time, pending=False):
+    """ Assigns orders to couriers creating a bundle for each of them.
+        `assignments` is a `list` of `(courier, orders)` pairs with
+        non-empty `list`s of orders. Bundles' ids are generated by the
+        database sequence, all the bundles are inserted by one flush.
+        `pending` bundles are created without assign time, which is set
+        by `activate_pending_bundle`.\n
+        Changes are not committed.
+    """
+    bundles = [OrdersBundle(courier_id=courier.courier_id,
+                            init_courier_type=courier.courier_type,
+                            assign_time=assign_time,
+                            open_orders=len(orders),
+                            pending=pending)
+               for courier, orders in assignments]
+    db.session.add_all(bundles)
+    db.session.flush()
+    for bundle, (courier, orders) in zip(bundles, assignments):
+        for order in orders:
+            order.assigned_courier = courier.courier_id
+            order.assign_time = assign_time
+            order.assigned = True
+            order.bundle = bundle.bundle_id
+
+
+def activate_pending_bundle(courier):
+    """ Hands over orders matched to the courier in push mode setting
+        their assign time. Returns `True` if there were such orders.\n
+        Changes are not committed.
+    """
+    bundle = (OrdersBundle.query.filter_by(courier_id=courier.courier_id,
+                                           completed=False, pending=True)
+                                .first())
+    if bundle is None:
+        return False
+    assign_time = datetime.now(tz=pytz.timezone('Europe/Moscow'))
+    bundle.assign_time = assign_time
+    bundle.pending = False
+    for order in Orders.query.filter_by(bundle=bundle.bundle_id):
+        order.assign_time = assign_time
+    return True
 
 
-def upd_bundle_check(courier_id):
-    """ This function updates orders' bundle attributes
-        and checks whether it is completed or not when
-        courier's attributes are changed.\n
-        Input: `courier_id`
+def idle_couriers(regions):
+    """ Returns a `list` of couriers working in any of the `regions`
+        who have no orders to deliver, locking them like
+        `locked_couriers` does. Couriers locked by other requests
+        are skipped.
+    """
+    region_couriers = (
+        db.session.query(CourierRegions.courier_id)
+                  .filter(CourierRegions.region_id.in_(regions)))
+    couriers = (Couriers.query.filter(Couriers.courier_id.in_(region_couriers))
+                              .order_by(Couriers.courier_id)
+                              .with_for_update(skip_locked=True, of=Couriers)
+                              .all())
+    # Bundles are checked after locking, so bundles created by requests
+    # which have just released the couriers are seen
+    courier_ids = [courier.courier_id for courier in couriers]
+    busy = {courier_id for courier_id, in
+            db.session.query(OrdersBundle.courier_id)
+                      .filter(OrdersBundle.courier_id.in_(courier_ids),
+                              ~OrdersBundle.completed)}
+    return [courier for courier in couriers
+            if courier.courier_id not in busy]
+
+
+def couriers_by_region_hour(couriers):
+    """ Reverse index of couriers: `dict` of `dict`s of `set`s
+        of couriers' ids by region and hour of the day they work in
+    """
+    index = {}
+    for courier in couriers:
+        slots = hour_slots(courier.working_intervals)
+        for region in courier.regions:
+            hours = index.setdefault(region, {})
+            for slot in slots:
+                hours.setdefault(slot, set()).add(courier.courier_id)
+    return index
+
+
+def push_orders(order_ids, strategy, time_budget):
+    """ Matches new orders with couriers who have no orders to deliver
+        and creates pending bundles for them, which are returned by
+        `/orders/assign`. Couriers for every order are found by
+        the reverse index of couriers by region and working hour,
+        orders are distributed among them by `assignment.pack_many`
+        with the `strategy`. Orders and couriers locked by other
+        requests are skipped.\n
+        Returns a `list` of matched orders' ids. Changes are committed.
     """
-    bundle = (OrdersBundle.query.filter_by(courier_id=courier_id,
+    orders = (Orders.query.filter(Orders.order_id.in_(order_ids),
+                                  ~Orders.assigned)
+                          .order_by(Orders.order_id)
+                          .with_for_update(skip_locked=True, of=Orders)
+                          .all())
+    # Couriers aren't locked if there is nothing to match
+    if len(orders) == 0:
+        db.session.rollback()
+        return []
+    couriers = idle_couriers({order.region for order in orders})
+    if len(couriers) == 0:
+        db.session.rollback()
+        return []
+
+    index = couriers_by_region_hour(couriers)
+    working_ranges = {courier.courier_id: courier.working_intervals
+                      for courier in couriers}
+    capacities = {courier.courier_id: CAPACITY[courier.courier_type]
+                  for courier in couriers}
+    candidates = {courier.courier_id: [] for courier in couriers}
+    for order in orders:
+        delivery_ranges = order.delivery_intervals
+        hours = index.get(order.region, {})
+        eligible = set()
+        for slot in hour_slots(delivery_ranges):
+            eligible.update(hours.get(slot, ()))
+        for courier_id in eligible:
+            if order.weight <= capacities[courier_id] and \
+                    ranges_intersect(working_ranges[courier_id],
+                                     delivery_ranges):
+                candidates[courier_id].append(order)
+
+    assigned = assignment.pack_many(
+        {courier_id: orders for courier_id, orders in candidates.items()
+         if len(orders) != 0}, capacities, strategy, time_budget)
+    bundles = [(courier, assigned[courier.courier_id])
+               for courier in couriers
+               if len(assigned.get(courier.courier_id, [])) != 0]
+    if len(bundles) == 0:
+        db.session.rollback()
+        return []
+    create_bundles(bundles, None, pending=True)
+    db.session.commit()
+    return [order.order_id for courier, orders in bundles
+            for order in orders]
+
+
+def reconcile_courier(courier, type_changed):
+    """ This function checks whether orders assigned to the courier
+        comply with his updated type, regions and working hours and
+        makes them available for assignment if not. Orders out of
+        courier's regions or working hours and, if his type was
+        changed (`type_changed`), orders exceeding his load capacity
+        (keeping the earliest orders which fit) are found by a single
+        query and dismissed by a single `UPDATE`. Loads are summed
+        in `assignment.weight_units` like assignment strategies do.
+        Courier's bundle is completed if no orders are left
+        to deliver.\n
+        Returns a `list` of dismissed orders' ids.
+        Changes are not committed.
+    """
+    bundle = (OrdersBundle.query.filter_by(courier_id=courier.courier_id,
                                            completed=False)
                                 .order_by(OrdersBundle.bundle_id.desc())
                                 .first())
     if bundle is None:
-        return
-
-    if len(bundle.orders) == 0:
+        return []
+
+    # Orders which are left should fit courier's load capacity,
+    # the earliest ones are kept
+    complies = and_(Orders.region.in_(courier.regions),
+                    delivered_in_hours(courier.working_intervals))
+    open_orders = (db.session.query(Orders.order_id, Orders.weight,
+                                    complies)
+                             .filter(Orders.bundle == bundle.bundle_id,
+                                     ~Orders.completed)
+                             .order_by(Orders.order_id))
+    capacity = assignment.weight_units(CAPACITY[courier.courier_type])
+    current_load = 0
+    dismissed_ids = []
+    for order_id, weight, order_complies in open_orders:
+        if not order_complies:
+            dismissed_ids.append(order_id)
+        elif type_changed:
+            load = assignment.weight_units(weight)
+            if current_load + load <= capacity:
+                current_load += load
+            else:
+                dismissed_ids.append(order_id)
+    if len(dismissed_ids) != 0:
+        (Orders.query.filter(Orders.order_id.in_(dismissed_ids))
+                     .update({Orders.assigned_courier: None,
+                              Orders.assign_time: None,
+                              Orders.assigned: False,
+                              Orders.bundle: None},
+                             synchronize_session=False))
+
+    bundle.open_orders -= len(dismissed_ids)
+    if bundle.open_orders != 0:
+        return dismissed_ids
+
+    # All the bundle's orders were dismissed
+    if bundle.last_complete_time is None:
         bundle.completed = True
         bundle.complete_time = datetime.now(tz=pytz.timezone('Europe/Moscow'))
         bundle.deleted = True
-        db.session.commit()
-        return
-
-    finished = bundle_finished(bundle)
-    if finished is True:
-        complete_bundle(bundle)
-        db.session.commit()
-
-    return
-
-
-def bundle_id():
-    """ Function creates orders' bundle id: #1 if there are no bundles
-        in the table and 'latest + 1' if the table is not empty.
-    """
-    last_bundle = OrdersBundle.query.order_by(OrdersBundle.bundle_id
-                                              .desc()).first()
-    if last_bundle is not None:
-        return last_bundle.bundle_id + 1
     else:
-        return 1
+        complete_bundle(bundle)
+    return dismissed_ids
 
 
 def bundle_finished(bundle):
@@ -212,10 +629,7 @@ def bundle_finished(bundle):
         in the bundle are finished or not
         and returns respective boolean value
     """
-    for order in bundle.orders:
-        if order.completed is False:
-            return False
-    return True
+    return bundle.open_orders == 0
 
 
 def complete_bundle(bundle, complete_time=None):
@@ -236,10 +650,50 @@ def complete_bundle(bundle, complete_time=None):
     return
 
 
-def order_delivery_time(order, complete_time):
+def parse_complete_time(complete_time):
+    """ Parses order completion time sent in ISO 8601 or RFC 3339
+        format into `datetime`. Raises `ValueError` if the format
+        is incorrect.
+    """
+    date_format = '%Y-%m-%dT%H:%M:%S.%f%z'
+    if complete_time[10] != 'T':
+        date_format = '%Y-%m-%d %H:%M:%S.%f%z'
+    return datetime.strptime(complete_time, date_format)
+
+
+def complete_order(order, bundle, courier, complete_time):
+    """ Function makes all necessary changes when the courier delivers
+        the order at `complete_time`: updates the order, its bundle
+        and courier's statistics and completes the bundle if it was
+        the last order to deliver. Orders which are already completed
+        are not changed.\n
+        Returns an error message if the completion time is less than
+        the previous one in the bundle, `None` otherwise.
+        Changes are not committed.
+    """
+    delivery_time = order_delivery_time(order, bundle, complete_time)
+    if type(delivery_time) != float:
+        return delivery_time
+    if order.completed is True:
+        return None
+
+    order.completed = True
+    order.complete_time = complete_time
+    order.delivery_time = delivery_time
+    bundle.open_orders -= 1
+    bundle.last_complete_time = complete_time
+    add_delivery_time(courier, order.region, delivery_time)
+
+    if bundle_finished(bundle) is True:
+        complete_bundle(bundle, complete_time)
+    return None
+
+
+def order_delivery_time(order, bundle, complete_time):
     """ This function calculates time consumed to deliver
-        the order taking as an input `Orders` object and
-        order completion time in `datetime` format.\n
+        the order taking as an input `Orders` object, its
+        `OrdersBundle` object and order completion time
+        in `datetime` format.\n
         If this is the first delivered order in the bundle,
         delivery time is a difference between completion time
         and bundle assign time. In case there were some
@@ -247,27 +701,54 @@ def order_delivery_time(order, complete_time):
         a difference between completion time and previous
         order completion time.
     """
-    bundle_orders = Orders.query.filter_by(bundle=order.bundle)
-    first_order = True
-    for b_order in bundle_orders:
-        if b_order.completed is True:
-            first_order = False
-            break
-
-    if first_order is True:
+    if bundle.last_complete_time is None:
         delivery_time = complete_time - order.assign_time
     else:
-        prev_order = (Orders.query.filter_by(bundle=order.bundle,
-                                             completed=True)
-                                  .order_by(Orders.complete_time.desc())
-                                  .first())
-        delivery_time = complete_time - prev_order.complete_time
+        delivery_time = complete_time - bundle.last_complete_time
     if delivery_time < timedelta():
         return 'Order completion time is less than the previous'
 
     return delivery_time.total_seconds()
 
 
+def add_delivery_time(courier, region_id, delivery_time):
+    """ Function updates courier's average delivery time in the region
+        and his minimal average delivery time among all the regions
+        when an order is delivered.\n
+        Input: `Couriers` object, region id and delivery time
+        in seconds
+    """
+    region = (Regions.query.filter_by(region_id=region_id,
+                                      courier_id=courier.courier_id)
+                           .first())
+    if region is None:
+        region = Regions(region_id=region_id,
+                         courier_id=courier.courier_id,
+                         delivery_time_sum=0,
+                         orders_count=0)
+        db.session.add(region)
+        previous_average = None
+    else:
+        previous_average = region.delivery_time_sum / region.orders_count
+
+    region.delivery_time_sum += delivery_time
+    region.orders_count += 1
+    average = region.delivery_time_sum / region.orders_count
+    region.avg_delivery_time = average
+
+    minimum = courier.min_avg_delivery_time
+    if minimum is None or average <= minimum:
+        courier.min_avg_delivery_time = average
+    elif previous_average is not None and previous_average <= minimum:
+        # The minimal average has grown, other regions may be less now
+        db.session.flush()
+        courier.min_avg_delivery_time = (
+            db.session.query(db.func.min(Regions.delivery_time_sum /
+                                         Regions.orders_count))
+                      .filter(Regions.courier_id == courier.courier_id)
+                      .scalar())
+
+
 def rating(courier):
     """ Function calculates courier's rating based on minimal value of
         average delivery time per each region. If no orders were delivered,
@@ -275,14 +756,10 @@ def rating(courier):
         Input: `Couriers` object\n
         Output: `float` value
     """
-    regions = Regions.query.filter_by(courier_id=courier.courier_id)
-    delivery_times = []
-    for region in regions:
-        delivery_times.append(region.avg_delivery_time)
-    if len(delivery_times) == 0:
+    t = courier.min_avg_delivery_time
+    if t is None:
         return 0
 
-    t = min(delivery_times)
     rating = (60 * 60 - min(t, 60 * 60)) / (60 * 60) * 5
 
     return round(rating, 2)
@@ -0,0 +1,119 @@
+""" Fast validation of couriers and orders.
+
+    `SchemaValidator` is compiled from a marshmallow schema and returns
+    exactly the same errors `dict` as the schema's `validate` method.
+    Field values are first checked by plain Python functions which only
+    accept values that are certainly valid. Any other value is passed
+    to the schema field itself, so the error messages are produced
+    by marshmallow and stay the same.
+"""
+import re
+from marshmallow import missing, ValidationError
+from app.schemas import courier_schema, order_schema
+
+PERIOD = re.compile(r'(\d{1,2}):(\d{1,2})-(\d{1,2}):(\d{1,2})', re.ASCII)
+
+
+def non_negative_int(value):
+    return type(value) is int and value >= 0
+
+
+def non_negative_ints(value):
+    if type(value) is not list or len(value) == 0:
+        return False
+    for item in value:
+        if type(item) is not int or item < 0:
+            return False
+    return True
+
+
+def one_of(choices):
+    choices = set(choices)
+
+    def check(value):
+        return type(value) is str and value in choices
+    return check
+
+
+def weight(minimum, maximum):
+    def check(value):
+        if type(value) is not float and type(value) is not int:
+            return False
+        value = round(value, 2)
+        return minimum <= value <= maximum
+    return check
+
+
+def periods(value):
+    """ Checks a `list` of `'HH:MM-HH:MM'` time periods
+        without time inversion
+    """
+    if type(value) is not list or len(value) == 0:
+        return False
+    for period in value:
+        if type(period) is not str:
+            return False
+        match = PERIOD.fullmatch(period)
+        if match is None:
+            return False
+        start_h, start_m, end_h, end_m = map(int, match.groups())
+        if start_h > 23 or end_h > 23 or start_m > 59 or end_m > 59:
+            return False
+        if start_h * 60 + start_m > end_h * 60 + end_m:
+            return False
+    return True
+
+
+class SchemaValidator:
+    """ Validator compiled from the marshmallow `schema` and `checks`:
+        a `dict` of field names and functions returning `True`
+        for values which are certainly valid for these fields.
+    """
+
+    def __init__(self, schema, checks):
+        self.error_messages = schema.error_messages
+        self.fields = [(name, field, checks.get(name))
+                       for name, field in schema.load_fields.items()]
+        self.field_names = {name for name, field, check in self.fields}
+
+    def validate(self, data, partial=False):
+        """ Returns a `dict` of validation errors
+            in the same format as `Schema.validate`
+        """
+        errors = {}
+        for name, field, check in self.fields:
+            value = data.get(name, missing)
+            if value is missing:
+                if partial or not field.required:
+                    continue
+            elif check is not None and check(value):
+                continue
+            try:
+                field.deserialize(value, name, data)
+            except ValidationError as error:
+                errors[name] = error.messages
+
+        for key in set(data) - self.field_names:
+            errors[key] = [self.error_messages['unknown']]
+
+        return errors
+
+
+courier_fields = courier_schema.fields
+order_fields = order_schema.fields
+
+courier_validator = SchemaValidator(courier_schema, {
+    'courier_id': non_negative_int,
+    'courier_type': one_of(courier_fields['courier_type']
+                           .validators[0].choices),
+    'regions': non_negative_ints,
+    'working_hours': periods
+})
+
+order_validator = SchemaValidator(order_schema, {
+    'order_id': non_negative_int,
+    'weight': weight(order_fields['weight'].validators[0].min,
+                     order_fields['weight'].validators[0].max),
+    'region': non_negative_int,
+    'delivery_hours': periods
+})
@@ -1,13 +1,14 @@
 import pytz
 from flask import Flask, request, jsonify
 from datetime import datetime
-from itertools import product
-from marshmallow import ValidationError
 from sqlalchemy import types
 import app.utils as ut
-from app import app, db
-from app.models import Couriers, Orders, OrdersBundle, Regions
-from app.schemas import courier_schema, order_schema
+from app import (app, assignment, courier_cache, db, idempotency_store,
+                 listing, records)
+from app.models import Couriers, Orders, OrdersBundle, orders_archive
+from app.schemas import courier_schema
+from app.validators import (courier_validator, non_negative_ints,
+                            order_validator)
 
 
 @app.route("/")
@@ -15,55 +16,55 @@ def home():
     return 'Candy Delivery App API', 200
 
 
-@app.route("/couriers", methods=['POST'])
+@app.route("/couriers", methods=['GET', 'POST'])
 def couriers():
+    if request.method == 'GET':
+        return listing.list_response(request.args, 'couriers',
+                                     listing.COURIER_FILTERS,
+                                     listing.couriers_query,
+                                     listing.couriers_items, 'courier_id')
+
     if request.method == 'POST':
         valid_keys = ['courier_id', 'courier_type',
                       'regions', 'working_hours']
         invalid_ids = {'couriers': []}
-        couriers = []
+        courier_ids = []
         errors = []
 
-        data = request.get_json()
+        # Couriers are validated and inserted in chunks inside a single
+        # transaction which is committed only if all of them are valid
+        seen_ids = set()
         try:
-            for element in data['data']:
-                keys_list = list(element.keys())
-                keys_list.sort()
-                if keys_list != valid_keys:
-                    errors.append({
-                        f"id {element['order_id']}": 'Incorrect properties'
-                    })
-                    invalid_ids['couriers'].append(element['courier_id'])
-                    continue
-
-                # Validation of data contained in received JSON via schema
-                try:
-                    courier = courier_schema.load(element)
-                    if not Couriers.query.get(element['courier_id']):
-                        couriers.append(courier)
-                    else:
-                        errors.append({
-                            f"id {element['courier_id']}": 'id already exists'
-                        })
-                        invalid_ids['couriers'].append(element['courier_id'])
-                except ValidationError as err:
-                    invalid_ids['couriers'].append(element['courier_id'])
-                    errors.append({f"id {element['courier_id']}": str(err)})
+            for chunk in ut.data_chunks(request,
+                                        app.config['IMPORT_CHUNK_SIZE'],
+                                        app.config['STREAM_IMPORT_MIN_SIZE']):
+                couriers, chunk_invalid_ids, chunk_errors = ut.check_elements(
+                    chunk, valid_keys, courier_validator,
+                    Couriers.courier_id, seen_ids)
+                invalid_ids['couriers'].extend(chunk_invalid_ids)
+                errors.extend(chunk_errors)
+                if len(invalid_ids['couriers']) == 0:
+                    ut.insert_couriers(couriers)
+                    courier_ids.extend(courier['courier_id']
+                                       for courier in couriers)
         except KeyError:
+            db.session.rollback()
             bad_request_msg = {
                 'Error': "'data' key was not found"
             }
             return jsonify(bad_request_msg), 400
+        except ValueError:
+            db.session.rollback()
+            return 'Bad Request', 400
 
         if len(invalid_ids['couriers']) != 0:
+            db.session.rollback()
             validation_response = ut.validation_error(invalid_ids, errors)
             return jsonify(validation_response), 400
 
         else:
-            for courier in couriers:
-                db.session.add(courier)
             db.session.commit()
-            success_response = ut.creation_success(data, 'couriers')
+            success_response = ut.creation_success(courier_ids, 'couriers')
 
         return success_response, 201
 
@@ -73,9 +74,9 @@ def couriers():
 @app.route("/couriers/<int:courier_id>", methods=['GET', 'PATCH'])
 def courier_info(courier_id):
     if request.method == 'PATCH':
-        courier = Couriers.query.filter_by(courier_id=courier_id)
+        courier = ut.locked_courier(courier_id)
 
-        if courier.first() is not None:
+        if courier is not None:
             data = request.get_json()
 
             for key in data.keys():
@@ -85,27 +86,23 @@ def courier_info(courier_id):
                     }
                     return jsonify(bad_request_msg), 400
 
-            errors = courier_schema.validate(data, partial=True)
+            errors = courier_validator.validate(data, partial=True)
             if len(errors) != 0:
                 bad_request_msg = {
                     'Error': errors
                 }
                 return jsonify(bad_request_msg), 400
-            courier.update(data, synchronize_session=False)
-            db.session.commit()
-
-            """ This block of code checks whether new courier info
-                complies with assigned orders and dismisses them if
-                necessary.
-            """
             for key, value in data.items():
-                if key == 'courier_type':
-                    ut.courier_type_upd(value, courier_id)
-                elif key == 'regions':
-                    ut.regions_upd(value, courier_id)
-                elif key == 'working_hours':
-                    ut.working_hours_upd(value, courier_id)
-            response = courier_schema.dump(courier.first())
+                setattr(courier, key, value)
+
+            # Dismisses assigned orders which don't comply
+            # with new courier info
+            dismissed_ids = ut.reconcile_courier(courier,
+                                                 'courier_type' in data)
+            db.session.commit()
+            courier_cache.invalidate(courier_id)
+            ut.index_orders(dismissed_ids)
+            response = courier_schema.dump(courier)
             del response['earnings']
             del response['rating']
             return jsonify(response), 200
@@ -114,75 +111,69 @@ def courier_info(courier_id):
             return 'Not Found', 404
 
     if request.method == 'GET':
-        courier = Couriers.query.get(courier_id)
+        courier = courier_cache.get(courier_id)
         if courier is None:
-            return 'Not Found', 404
-
-        not_completed = True
-        for bundle in courier.bundles:
-            if bundle.completed is True and bundle.deleted is False:
-                not_completed = False
-
-        if len(courier.bundles) == 0 or not_completed is True:
-            courier = courier_schema.dump(courier)
-            del courier['earnings']
-            del courier['rating']
-        else:
-            courier = courier_schema.dump(courier)
+            courier = ut.courier_profile(courier_id)
+            if courier is None:
+                return 'Not Found', 404
+            courier_cache.set(courier_id, courier)
 
         return jsonify(courier), 200
 
     return 'Method Not Allowed', 405
 
 
-@app.route("/orders", methods=['POST'])
+@app.route("/orders", methods=['GET', 'POST'])
 def orders():
+    if request.method == 'GET':
+        return listing.list_response(request.args, 'orders',
+                                     listing.ORDER_FILTERS,
+                                     listing.orders_query,
+                                     listing.orders_items, 'order_id')
+
     if request.method == 'POST':
         valid_keys = ['delivery_hours', 'order_id', 'region', 'weight']
         invalid_ids = {'orders': []}
-        orders = []
+        order_ids = []
         errors = []
 
-        data = request.get_json()
+        # Orders are validated and inserted in chunks inside a single
+        # transaction which is committed only if all of them are valid
+        seen_ids = set()
         try:
-            for element in data['data']:
-                keys_list = list(element.keys())
-                keys_list.sort()
-                if keys_list != valid_keys:
-                    invalid_ids['orders'].append(element['order_id'])
-                    errors.append({
-                        f"id {element['order_id']}": 'Incorrect properties'
-                    })
-                    continue
-
-                # Validation of data contained in received JSON via schema
-                try:
-                    order = order_schema.load(element)
-                    if not Orders.query.get(element['order_id']):
-                        orders.append(order)
-                    else:
-                        invalid_ids['orders'].append(element['order_id'])
-                        errors.append({
-                            f"id {element['order_id']}": 'id already exists'
-                        })
-                except ValidationError as err:
-                    invalid_ids['orders'].append(element['order_id'])
-                    errors.append({f"id {element['order_id']}": str(err)})
+            for chunk in ut.data_chunks(request,
+                                        app.config['IMPORT_CHUNK_SIZE'],
+                                        app.config['STREAM_IMPORT_MIN_SIZE']):
+                orders, chunk_invalid_ids, chunk_errors = ut.check_elements(
+                    chunk, valid_keys, order_validator, Orders.order_id,
+                    seen_ids, orders_archive.c.order_id)
+                invalid_ids['orders'].extend(chunk_invalid_ids)
+                errors.extend(chunk_errors)
+                if len(invalid_ids['orders']) == 0:
+                    ut.insert_orders(orders)
+                    order_ids.extend(order['order_id'] for order in orders)
         except KeyError:
+            db.session.rollback()
             bad_request_msg = {
                 'Error': "'data' key was not found"
             }
             return jsonify(bad_request_msg), 400
+        except ValueError:
+            db.session.rollback()
+            return 'Bad Request', 400
 
         if len(invalid_ids['orders']) != 0:
+            db.session.rollback()
             validation_response = ut.validation_error(invalid_ids, errors)
             return jsonify(validation_response), 400
 
         else:
-            for order in orders:
-                db.session.add(order)
             db.session.commit()
-            success_response = ut.creation_success(data, 'orders')
+            if app.config['PUSH_ASSIGNMENT']:
+                ut.push_orders(order_ids, app.config['ASSIGNMENT_STRATEGY'],
+                               app.config['ASSIGNMENT_TIME_BUDGET'])
+            ut.index_orders(order_ids)
+            success_response = ut.creation_success(order_ids, 'orders')
 
         return success_response, 201
 
@@ -190,6 +181,7 @@ def orders():
 
 
 @app.route("/orders/assign", methods=['POST'])
+@idempotency_store.replay
 def assign_order():
     if request.method == 'POST':
         data = request.get_json()
@@ -202,64 +194,51 @@ def assign_order():
         except AttributeError:
             return 'Bad Request', 400
 
-        errors = courier_schema.validate(data, partial=True)
+        errors = courier_validator.validate(data, partial=True)
         if len(errors) != 0:
             bad_request_msg = {
                 'Error': errors
             }
             return jsonify(bad_request_msg), 400
 
-        courier = Couriers.query.get(data['courier_id'])
+        courier = ut.locked_courier(data['courier_id'])
         if courier is None:
             bad_request_msg = {
                 'Error': 'Courier id was not found'
             }
             return jsonify(bad_request_msg), 400
 
+        # Orders matched to the courier when they were created
+        # are handed over at the first request
+        if ut.activate_pending_bundle(courier):
+            db.session.commit()
+            courier_cache.invalidate(data['courier_id'])
+
         # The following block checks whether the courier already
         # has assigned and not completed orders
-        orders = Orders.query.filter_by(assigned_courier=data['courier_id'],
-                                        completed=False).all()
+        orders = records.open_orders([data['courier_id']])
         if len(orders) != 0:
             orders_msg = ut.assigned_orders_msg(orders,
                                                 orders[0].assign_time)
             return jsonify(orders_msg), 200
 
-        courier_ranges = ut.datetime_ranges(courier.working_hours)
         courier_capacity = ut.CAPACITY[courier.courier_type]
-
-        available_orders = Orders.query.filter_by(assigned=False)
-        assign_time = datetime.now(tz=pytz.timezone('Europe/Moscow'))
-        assigned_orders = []
-        bundle_id = ut.bundle_id()
-        for order in available_orders:
-            if order.region in courier.regions and \
-                    courier_capacity >= order.weight:
-                order_ranges = ut.datetime_ranges(order.delivery_hours)
-                for c_range, o_range in product(courier_ranges, order_ranges):
-                    if c_range.is_intersection(o_range):
-                        order.assigned_courier = courier.courier_id
-                        order.assign_time = assign_time
-                        order.assigned = True
-                        order.bundle = bundle_id
-                        courier_capacity -= order.weight
-                        assigned_orders.append(order)
-                        break
-                continue
-            else:
-                continue
+        available_orders = ut.candidate_orders(
+            list(courier.regions), courier_capacity,
+            courier.working_intervals,
+            app.config['ASSIGNMENT_CANDIDATES_LIMIT'])
+        assigned_orders = assignment.pack(
+            available_orders, courier_capacity,
+            app.config['ASSIGNMENT_STRATEGY'],
+            app.config['ASSIGNMENT_TIME_BUDGET'])
 
         if len(assigned_orders) != 0:
-            bundle = OrdersBundle(bundle_id=bundle_id,
-                                  courier_id=courier.courier_id,
-                                  init_courier_type=courier.courier_type,
-                                  assign_time=assign_time)
-            db.session.add(bundle)
+            assign_time = datetime.now(tz=pytz.timezone('Europe/Moscow'))
+            ut.create_bundles([(courier, assigned_orders)], assign_time)
             db.session.commit()
-            orders = (Orders.query
-                      .filter_by(completed=False,
-                                 assigned_courier=courier.courier_id)
-                      .all())
+            courier_cache.invalidate(data['courier_id'])
+            orders = records.open_orders([data['courier_id']])
+            ut.unindex_orders(orders)
             assignment_msg = ut.assigned_orders_msg(orders,
                                                     orders[0].assign_time)
         else:
@@ -270,7 +249,92 @@ def assign_order():
     return 'Method Not Allowed', 405
 
 
+@app.route("/orders/assign/batch", methods=['POST'])
+@idempotency_store.replay
+def assign_orders():
+    if request.method == 'POST':
+        data = request.get_json()
+        try:
+            if list(data.keys()) != ['data']:
+                bad_request_msg = {
+                    'Error': 'Additional properties are not allowed'
+                }
+                return jsonify(bad_request_msg), 400
+        except AttributeError:
+            return 'Bad Request', 400
+
+        if not non_negative_ints(data['data']):
+            bad_request_msg = {
+                'Error': "'data' should be a list of couriers' ids"
+            }
+            return jsonify(bad_request_msg), 400
+        courier_ids = list(dict.fromkeys(data['data']))
+
+        couriers = ut.locked_couriers(courier_ids)
+        # Orders matched to couriers when they were created are handed
+        # over at the first request
+        activated = [courier_id for courier_id, courier in couriers.items()
+                     if ut.activate_pending_bundle(courier)]
+        open_orders = records.open_orders(list(couriers))
+        assignments = {courier_id: [] for courier_id in couriers}
+        for order in open_orders:
+            assignments[order.assigned_courier].append(order)
+
+        # Orders are distributed among couriers without assigned ones
+        free_couriers = [courier for courier_id, courier in couriers.items()
+                         if len(assignments[courier_id]) == 0]
+        new_bundles = []
+        if len(free_couriers) != 0:
+            pool = ut.candidate_pool(
+                free_couriers, app.config['ASSIGNMENT_CANDIDATES_LIMIT'])
+            capacities = {courier.courier_id:
+                          ut.CAPACITY[courier.courier_type]
+                          for courier in free_couriers}
+            assigned = assignment.pack_many(
+                ut.eligible_orders(free_couriers, pool), capacities,
+                app.config['ASSIGNMENT_STRATEGY'],
+                app.config['ASSIGNMENT_TIME_BUDGET'])
+
+            assign_time = datetime.now(tz=pytz.timezone('Europe/Moscow'))
+            new_bundles = [(courier, assigned[courier.courier_id])
+                           for courier in free_couriers
+                           if len(assigned[courier.courier_id]) != 0]
+            if len(new_bundles) != 0:
+                ut.create_bundles(new_bundles, assign_time)
+
+        new_ids = [courier.courier_id for courier, _ in new_bundles]
+        if len(new_bundles) != 0 or len(activated) != 0:
+            db.session.commit()
+        for courier_id in activated + new_ids:
+            courier_cache.invalidate(courier_id)
+        if len(new_ids) != 0:
+            new_orders = records.open_orders(new_ids)
+            for order in new_orders:
+                assignments[order.assigned_courier].append(order)
+            ut.unindex_orders(new_orders)
+
+        results = []
+        for courier_id in courier_ids:
+            if courier_id not in couriers:
+                courier_msg = {
+                    'Error': 'Courier id was not found'
+                }
+            elif len(assignments[courier_id]) != 0:
+                orders = assignments[courier_id]
+                courier_msg = ut.assigned_orders_msg(orders,
+                                                     orders[0].assign_time)
+            else:
+                courier_msg = ut.assigned_orders_msg([])
+            courier_msg['courier_id'] = courier_id
+            results.append(courier_msg)
+
+        return jsonify({'couriers': results}), 200
+
+    return 'Method Not Allowed', 405
+
+
 @app.route("/orders/complete", methods=['POST'])
+@idempotency_store.replay
 def order_completed():
     if request.method == 'POST':
         valid_keys = ['complete_time', 'courier_id', 'order_id']
@@ -292,58 +356,40 @@ def order_completed():
             return jsonify(bad_request_msg), 400
 
         order = Orders.query.get(data['order_id'])
+        if order is not None and order.assigned is True:
+            # Courier's orders are changed by one request at a time
+            ut.locked_courier(order.assigned_courier)
+            db.session.refresh(order)
         if order is None or order.assigned is False or \
-                order.assigned_courier != data['courier_id']:
+                order.assigned_courier != data['courier_id'] or \
+                order.assign_time is None:
             bad_request_msg = {
                 'Error': 'Sent values are incorrect'
             }
             return jsonify(bad_request_msg), 400
 
-        date_format = '%Y-%m-%dT%H:%M:%S.%f%z'
-        if data['complete_time'][10] != 'T':
-            date_format = '%Y-%m-%d %H:%M:%S.%f%z'
         try:
-            complete_time = datetime.strptime(data['complete_time'],
-                                              date_format)
+            complete_time = ut.parse_complete_time(data['complete_time'])
         except ValueError:
             bad_request_msg = {
                 'Error': 'Datetime format should be ISO 8601 or RFC3339'
             }
             return jsonify(bad_request_msg), 400
 
-        delivery_time = ut.order_delivery_time(order, complete_time)
-        if type(delivery_time) != float:
+        completed = order.completed
+        bundle = OrdersBundle.query.get(order.bundle)
+        # Courier is already loaded by `locked_courier`
+        courier = Couriers.query.get(order.assigned_courier)
+        error = ut.complete_order(order, bundle, courier, complete_time)
+        if error is not None:
             bad_request_msg = {
-                'Error': f'{delivery_time}'
+                'Error': f'{error}'
             }
             return jsonify(bad_request_msg), 400
 
-        if order.completed is False:
-            order.completed = True
-            order.complete_time = complete_time
-            order.delivery_time = delivery_time
-            db.session.commit()
-
-            # The following block updates average delivery time
-            # per region when the order is completed
-            regions = (Regions.query.filter_by(region_id=order.region,
-                                               courier_id=data['courier_id'])
-                                    .first())
-            if regions is not None:
-                average = regions.avg_delivery_time
-                average = (average + delivery_time) / 2
-                regions.avg_delivery_time = average
-            else:
-                new_region = Regions(region_id=order.region,
-                                     courier_id=order.assigned_courier,
-                                     avg_delivery_time=delivery_time)
-                db.session.add(new_region)
-
-            bundle = OrdersBundle.query.get(order.bundle)
-            bundle_finished = ut.bundle_finished(bundle)
-            if bundle_finished is True:
-                ut.complete_bundle(bundle, complete_time)
+        if completed is False:
             db.session.commit()
+            courier_cache.invalidate(order.assigned_courier)
 
         success_msg = {
             'order_id': order.order_id
@@ -352,3 +398,100 @@ def order_completed():
         return jsonify(success_msg), 200
 
     return 'Method Not Allowed', 405
+
+
+@app.route("/orders/complete/batch", methods=['POST'])
+@idempotency_store.replay
+def orders_completed():
+    if request.method == 'POST':
+        valid_keys = ['complete_time', 'courier_id', 'order_id']
+        try:
+            data = request.get_json()['data']
+            items = list(enumerate(data))
+        except KeyError:
+            bad_request_msg = {
+                'Error': "'data' key was not found"
+            }
+            return jsonify(bad_request_msg), 400
+        except TypeError:
+            bad_request_msg = {
+                'Error': 'POST data is incorrect'
+            }
+            return jsonify(bad_request_msg), 400
+
+        # Results are returned in the order of received completions
+        results = [None] * len(items)
+        completions = []
+        for i, item in items:
+            if type(item) is not dict or sorted(item.keys()) != valid_keys:
+                results[i] = {
+                    'Error': 'Incorrect properties'
+                }
+                continue
+            try:
+                complete_time = ut.parse_complete_time(item['complete_time'])
+            except (ValueError, TypeError, IndexError):
+                results[i] = {
+                    'order_id': item['order_id'],
+                    'Error': 'Datetime format should be ISO 8601 or RFC3339'
+                }
+                continue
+            completions.append((complete_time, i, item))
+
+        # Courier's orders are changed by one request at a time
+        couriers = ut.locked_couriers({item['courier_id']
+                                       for _, _, item in completions
+                                       if type(item['courier_id']) is int})
+        orders = (Orders.query.filter(Orders.order_id.in_(
+                      {item['order_id'] for _, _, item in completions
+                       if type(item['order_id']) is int}))
+                              .populate_existing()
+                              .all())
+        orders = {order.order_id: order for order in orders}
+        bundles = (OrdersBundle.query.filter(OrdersBundle.bundle_id.in_(
+                       {order.bundle for order in orders.values()
+                        if order.bundle is not None}))
+                                     .all())
+        bundles = {bundle.bundle_id: bundle for bundle in bundles}
+
+        # Orders of a bundle are completed one after another,
+        # so delivery times are calculated in order of completion
+        completions.sort(key=lambda completion: completion[:2])
+        changed_couriers = set()
+        for complete_time, i, item in completions:
+            order = None
+            if type(item['order_id']) is int:
+                order = orders.get(item['order_id'])
+            if order is None or order.assigned is False or \
+                    order.assigned_courier != item['courier_id'] or \
+                    order.assigned_courier not in couriers or \
+                    order.assign_time is None:
+                results[i] = {
+                    'order_id': item['order_id'],
+                    'Error': 'Sent values are incorrect'
+                }
+                continue
+
+            completed = order.completed
+            error = ut.complete_order(order, bundles[order.bundle],
+                                      couriers[order.assigned_courier],
+                                      complete_time)
+            if error is not None:
+                results[i] = {
+                    'order_id': order.order_id,
+                    'Error': f'{error}'
+                }
+                continue
+            if completed is False:
+                changed_couriers.add(order.assigned_courier)
+            results[i] = {
+                'order_id': order.order_id
+            }
+
+        db.session.commit()
+        for courier_id in changed_couriers:
+            courier_cache.invalidate(courier_id)
+
+        return jsonify({'orders': results}), 200
+
+    return 'Method Not Allowed', 405
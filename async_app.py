@@ -0,0 +1,19 @@
+""" Asynchronous serving mode.
+
+    Runs the same application on gevent: every request is handled by
+    a greenlet, and while it waits for the database or the network the
+    worker serves other requests, so the number of concurrent requests
+    isn't limited by the number of workers. psycopg2 is switched into
+    its asynchronous mode, the connections are shared by the greenlets
+    through the bounded SQLAlchemy pool, requests wait for a free
+    connection when all of them are busy.\n
+    Usage: `gunicorn --worker-class gevent --worker-connections 1000
+    --bind 0.0.0.0:8080 async_app:app`
+"""
+from gevent import monkey
+monkey.patch_all()
+
+from psycogreen.gevent import patch_psycopg  # noqa: E402
+patch_psycopg()
+
+from app import app  # noqa: E402,F401
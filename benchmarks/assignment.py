@@ -0,0 +1,83 @@
+""" Benchmark of orders assignment strategies.
+
+    Generates pools of orders which are available for a courier and
+    reports how many kilograms every strategy from
+    `app.assignment.STRATEGIES` assigns per `/orders/assign` call
+    and how long it takes.\n
+    Usage: `python -m benchmarks.assignment --orders 200 --calls 100`
+"""
+import argparse
+import json
+import random
+import time
+from collections import namedtuple
+from app import assignment
+from app.utils import CAPACITY
+
+Order = namedtuple('Order', ['order_id', 'weight'])
+
+
+def orders_pool(size, max_weight, rng):
+    """ Generates a `list` of `size` orders weighing
+        from 0.01 to `max_weight` kilograms
+    """
+    return [Order(order_id, round(rng.uniform(0.01, max_weight), 2))
+            for order_id in range(size)]
+
+
+def run(orders, calls, time_budget, seed):
+    rng = random.Random(seed)
+    pools = {courier_type: [orders_pool(orders, capacity, rng)
+                            for _ in range(calls)]
+             for courier_type, capacity in CAPACITY.items()}
+
+    results = {}
+    for strategy in assignment.STRATEGIES:
+        results[strategy] = {}
+        for courier_type, capacity in CAPACITY.items():
+            assigned_kg = 0
+            start = time.perf_counter()
+            for pool in pools[courier_type]:
+                assigned = assignment.pack(pool, capacity,
+                                           strategy, time_budget)
+                assigned_kg += sum(order.weight for order in assigned)
+            elapsed = time.perf_counter() - start
+            results[strategy][courier_type] = {
+                'kg_per_call': round(assigned_kg / calls, 2),
+                'load_percent': round(assigned_kg / calls / capacity * 100,
+                                      1),
+                'ms_per_call': round(elapsed / calls * 1000, 3)
+            }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--orders', type=int, default=50,
+                        help='available orders per assignment call')
+    parser.add_argument('--calls', type=int, default=200,
+                        help='assignment calls per courier type')
+    parser.add_argument('--time-budget', type=float, default=0.05,
+                        help='seconds a strategy may spend per call')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', action='store_true',
+                        help='print results as JSON')
+    args = parser.parse_args()
+
+    results = run(args.orders, args.calls, args.time_budget, args.seed)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f'{"strategy":<22}{"type":<6}{"kg/call":>10}'
+          f'{"load %":>9}{"ms/call":>10}')
+    for strategy, types in results.items():
+        for courier_type, result in types.items():
+            print(f'{strategy:<22}{courier_type:<6}'
+                  f'{result["kg_per_call"]:>10}'
+                  f'{result["load_percent"]:>9}'
+                  f'{result["ms_per_call"]:>10}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+""" Stress test of concurrent orders assignment.
+
+    Fires `/orders/assign` requests for many couriers from parallel
+    threads (and repeats them for the same couriers) and checks that
+    no order was assigned twice, every order belongs to the courier
+    and bundle it was reported for and couriers are not overloaded.\n
+    WARNING: all tables of the database are dropped and recreated.\n
+    Usage: `python -m benchmarks.concurrency --database-url URL`
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--database-url', required=True,
+                        help='throwaway PostgreSQL database')
+    parser.add_argument('--couriers', type=int, default=100)
+    parser.add_argument('--orders', type=int, default=3000)
+    parser.add_argument('--regions', type=int, default=5)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    os.environ['DATABASE_URL'] = args.database_url
+    from app import app, db
+    from app.models import Orders, OrdersBundle
+    from app.utils import CAPACITY
+
+    db.drop_all()
+    db.create_all()
+    rng = random.Random(args.seed)
+    client = app.test_client()
+    couriers = [{'courier_id': courier_id,
+                 'courier_type': rng.choice(list(CAPACITY)),
+                 'regions': rng.sample(range(args.regions),
+                                       min(args.regions, rng.randint(1, 2))),
+                 'working_hours': ['08:00-20:00']}
+                for courier_id in range(1, args.couriers + 1)]
+    orders = [{'order_id': order_id,
+               'weight': round(rng.uniform(0.01, 10), 2),
+               'region': rng.randrange(args.regions),
+               'delivery_hours': ['09:00-18:00']}
+              for order_id in range(1, args.orders + 1)]
+    client.post('/couriers', json={'data': couriers})
+    client.post('/orders', json={'data': orders})
+
+    def assign(courier_id):
+        response = app.test_client().post('/orders/assign',
+                                          json={'courier_id': courier_id})
+        return courier_id, response.status_code, response.get_json()
+
+    requests = [courier['courier_id'] for courier in couriers] * 2
+    rng.shuffle(requests)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(args.threads) as executor:
+        responses = list(executor.map(assign, requests))
+    elapsed = time.perf_counter() - start
+
+    problems = []
+    claimed = {}
+    for courier_id, status, body in responses:
+        if status != 200:
+            problems.append(f'Courier {courier_id}: HTTP {status}')
+            continue
+        for order in body['orders']:
+            owner = claimed.setdefault(order['id'], courier_id)
+            if owner != courier_id:
+                problems.append(f'Order {order["id"]} is reported for '
+                                f'couriers {owner} and {courier_id}')
+
+    types = {courier['courier_id']: courier['courier_type']
+             for courier in couriers}
+    with app.app_context():
+        assigned = Orders.query.filter_by(assigned=True).all()
+        bundles = {bundle.bundle_id: bundle
+                   for bundle in OrdersBundle.query.all()}
+        load = Counter()
+        for order in assigned:
+            load[order.assigned_courier] += order.weight
+            bundle = bundles.get(order.bundle)
+            if bundle is None or bundle.courier_id != order.assigned_courier:
+                problems.append(f'Order {order.order_id} bundle '
+                                f'{order.bundle} belongs to another courier')
+            if claimed.get(order.order_id) != order.assigned_courier:
+                problems.append(f'Order {order.order_id} is assigned to '
+                                f'courier {order.assigned_courier}, reported '
+                                f'for {claimed.get(order.order_id)}')
+        for courier_id, weight in load.items():
+            if weight > CAPACITY[types[courier_id]] + 0.01:
+                problems.append(f'Courier {courier_id} carries {weight} kg')
+        open_bundles = Counter(bundle.courier_id
+                               for bundle in bundles.values()
+                               if not bundle.completed)
+        for courier_id, count in open_bundles.items():
+            if count > 1:
+                problems.append(f'Courier {courier_id} has {count} '
+                                f'open bundles')
+
+    print(f'{len(responses)} assign requests in {elapsed:.2f} s '
+          f'({len(responses) / elapsed:.0f} req/s) with {args.threads} '
+          f'threads, {len(assigned)} orders assigned')
+    for problem in problems[:20]:
+        print(problem)
+    print(f'Problems found: {len(problems)}')
+    if problems:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,280 @@
+""" Load test of the API endpoints.
+
+    Generates synthetic couriers and orders, imports them and drives
+    `GET` and `PATCH /couriers/$courier_id`, `/orders/assign` and
+    `/orders/complete` through the Flask test client or a running
+    server. Reports latency percentiles, throughput and the number of
+    SQL queries per request for every endpoint and saves them as JSON,
+    so results of different commits can be compared with `--compare`.\n
+    SQLite doesn't keep time zones of assignment times, so completions
+    are rejected there and `/orders/complete` is skipped: use PostgreSQL
+    to measure it.\n
+    WARNING: all tables of the database are dropped and recreated.\n
+    Usage: `python -m benchmarks.endpoints --database-url URL
+    --couriers 1000 --orders 10000 --output results.json`
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from datetime import datetime, timedelta
+
+COURIER_TYPES = ['foot', 'bike', 'car']
+
+
+def random_period(hours, rng):
+    """ Generates an `'HH:MM-HH:MM'` period. With `uniform` hours it
+        may start at any time of the day, with `peak` hours most of
+        the periods are around lunch and evening.
+    """
+    if hours == 'uniform':
+        start = rng.randrange(0, 22 * 60)
+    else:
+        peak = rng.choice([13 * 60, 19 * 60])
+        start = int(min(max(rng.gauss(peak, 90), 0), 22 * 60))
+    end = min(start + rng.randrange(30, 8 * 60), 23 * 60 + 59)
+    return (f'{start // 60:02d}:{start % 60:02d}-'
+            f'{end // 60:02d}:{end % 60:02d}')
+
+
+def generate(args, rng):
+    couriers = [{'courier_id': courier_id,
+                 'courier_type': rng.choice(COURIER_TYPES),
+                 'regions': rng.sample(range(args.regions),
+                                       min(args.regions, rng.randint(1, 3))),
+                 'working_hours': [random_period(args.hours, rng)
+                                   for _ in range(rng.randint(1, 2))]}
+                for courier_id in range(1, args.couriers + 1)]
+    orders = [{'order_id': order_id,
+               'weight': round(rng.uniform(0.01, 50), 2),
+               'region': rng.randrange(args.regions),
+               'delivery_hours': [random_period(args.hours, rng)
+                                  for _ in range(rng.randint(1, 2))]}
+              for order_id in range(1, args.orders + 1)]
+    return couriers, orders
+
+
+class TestClient:
+    """ Sends requests through the Flask test client
+        counting SQL queries executed by each of them
+    """
+
+    def __init__(self):
+        from sqlalchemy import event
+        from app import app, db
+        self.client = app.test_client()
+        self.queries = 0
+
+        def count(*args):
+            self.queries += 1
+        with app.app_context():
+            event.listen(db.engine, 'before_cursor_execute', count)
+
+    def request(self, method, url, data):
+        self.queries = 0
+        response = self.client.open(url, method=method, json=data)
+        return response.status_code, response.get_json(), self.queries
+
+
+class ServerClient:
+    """ Sends requests to a running server, queries are not counted """
+
+    def __init__(self, url):
+        self.url = url.rstrip('/')
+
+    def request(self, method, url, data):
+        body = None if data is None else json.dumps(data).encode()
+        request = urllib.request.Request(
+            self.url + url, data=body, method=method,
+            headers={'Content-Type': 'application/json'})
+        try:
+            with urllib.request.urlopen(request) as response:
+                return response.status, json.loads(response.read()), None
+        except urllib.error.HTTPError as error:
+            return error.code, None, None
+
+
+class Recorder:
+    """ Collects latencies and query counts by endpoint """
+
+    def __init__(self, client):
+        self.client = client
+        self.samples = {}
+
+    def request(self, endpoint, method, url, data=None):
+        start = time.perf_counter()
+        status, body, queries = self.client.request(method, url, data)
+        elapsed = time.perf_counter() - start
+        self.samples.setdefault(endpoint, []).append(
+            (elapsed, queries, status))
+        return status, body
+
+    def report(self):
+        results = {}
+        for endpoint, samples in self.samples.items():
+            latencies = sorted(elapsed for elapsed, _, _ in samples)
+            queries = [count for _, count, _ in samples if count is not None]
+            statuses = {}
+            for _, _, status in samples:
+                statuses[str(status)] = statuses.get(str(status), 0) + 1
+            results[endpoint] = {
+                'requests': len(samples),
+                'statuses': statuses,
+                'throughput': len(samples) / sum(latencies),
+                'p50_ms': percentile(latencies, 50) * 1000,
+                'p95_ms': percentile(latencies, 95) * 1000,
+                'p99_ms': percentile(latencies, 99) * 1000,
+                'queries': (sum(queries) / len(queries)
+                            if queries else None)
+            }
+        return results
+
+
+def percentile(values, p):
+    """ Nearest rank percentile of sorted `values` """
+    rank = max(int(round(p / 100 * len(values))) - 1, 0)
+    return values[min(rank, len(values) - 1)]
+
+
+def run(args, recorder, rng, complete=True):
+    couriers, orders = generate(args, rng)
+    for i in range(0, len(couriers), args.batch_size):
+        recorder.request('POST /couriers', 'POST', '/couriers',
+                         {'data': couriers[i:i + args.batch_size]})
+    for i in range(0, len(orders), args.batch_size):
+        recorder.request('POST /orders', 'POST', '/orders',
+                         {'data': orders[i:i + args.batch_size]})
+
+    sample = rng.sample(couriers, min(args.requests, len(couriers)))
+    for courier in sample:
+        recorder.request('GET /couriers/$id', 'GET',
+                         f'/couriers/{courier["courier_id"]}')
+
+    assigned = {}
+    for courier in sample:
+        status, body = recorder.request(
+            'POST /orders/assign', 'POST', '/orders/assign',
+            {'courier_id': courier['courier_id']})
+        if status == 200 and body and body['orders']:
+            assigned[courier['courier_id']] = body
+
+    # Every other courier changes and loses part of his orders
+    for courier in sample[::2]:
+        recorder.request('PATCH /couriers/$id', 'PATCH',
+                         f'/couriers/{courier["courier_id"]}',
+                         {'courier_type': rng.choice(COURIER_TYPES),
+                          'regions': rng.sample(
+                              range(args.regions),
+                              min(args.regions, rng.randint(1, 3)))})
+
+    if not complete:
+        return
+    for courier_id, body in assigned.items():
+        complete_time = datetime.fromisoformat(body['assign_time'])
+        for order in body['orders']:
+            complete_time += timedelta(minutes=rng.randint(5, 30))
+            recorder.request('POST /orders/complete', 'POST',
+                             '/orders/complete',
+                             {'courier_id': courier_id,
+                              'order_id': order['id'],
+                              'complete_time': complete_time.isoformat()})
+
+
+def current_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                              capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results, baseline=None):
+    print(f'{"endpoint":<22}{"requests":>9}{"req/s":>9}{"p50 ms":>9}'
+          f'{"p95 ms":>9}{"p99 ms":>9}{"queries":>9}')
+    for endpoint, result in results.items():
+        queries = result['queries']
+        line = (f'{endpoint:<22}{result["requests"]:>9}'
+                f'{result["throughput"]:>9.0f}{result["p50_ms"]:>9.2f}'
+                f'{result["p95_ms"]:>9.2f}{result["p99_ms"]:>9.2f}'
+                f'{queries if queries is None else round(queries, 1):>9}')
+        if baseline is not None and endpoint in baseline:
+            change = result['p95_ms'] / baseline[endpoint]['p95_ms'] - 1
+            line += f'  p95 {change:+.0%}'
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--database-url',
+                        help='throwaway PostgreSQL or SQLite database '
+                             'used with the Flask test client')
+    target.add_argument('--server', help='URL of a running server with '
+                                         'an empty database')
+    parser.add_argument('--couriers', type=int, default=1000)
+    parser.add_argument('--orders', type=int, default=10000)
+    parser.add_argument('--regions', type=int, default=20)
+    parser.add_argument('--hours', choices=['uniform', 'peak'],
+                        default='uniform',
+                        help='distribution of working and delivery hours')
+    parser.add_argument('--batch-size', type=int, default=1000,
+                        help='couriers or orders per import request')
+    parser.add_argument('--requests', type=int, default=500,
+                        help='couriers sampled for GET, PATCH, assign '
+                             'and complete requests')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='JSON file to save results to')
+    parser.add_argument('--compare', help='JSON results of a previous run')
+    args = parser.parse_args()
+
+    if args.database_url is not None:
+        os.environ['DATABASE_URL'] = args.database_url
+        from app import app, db
+        with app.app_context():
+            if db.engine.dialect.name == 'postgresql':
+                db.session.execute('DROP SCHEMA public CASCADE')
+                db.session.execute('CREATE SCHEMA public')
+                db.session.commit()
+            else:
+                db.drop_all()
+            db.create_all()
+            complete = db.engine.dialect.name != 'sqlite'
+        recorder = Recorder(TestClient())
+    else:
+        complete = True
+        recorder = Recorder(ServerClient(args.server))
+
+    start = time.perf_counter()
+    run(args, recorder, random.Random(args.seed), complete)
+    elapsed = time.perf_counter() - start
+    results = recorder.report()
+
+    baseline = None
+    if args.compare is not None:
+        with open(args.compare) as file:
+            baseline = json.load(file)['endpoints']
+    print_results(results, baseline)
+    if not complete:
+        print('POST /orders/complete skipped: SQLite rejects completions')
+    print(f'Total time: {elapsed:.1f} s')
+
+    if args.output is not None:
+        parameters = vars(args).copy()
+        del parameters['output'], parameters['compare']
+        with open(args.output, 'w') as file:
+            json.dump({'commit': current_commit(),
+                       'parameters': parameters,
+                       'endpoints': results}, file, indent=2)
+    if any(status.startswith('5') for result in results.values()
+           for status in result['statuses']):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
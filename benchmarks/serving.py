@@ -0,0 +1,200 @@
+""" Benchmark of synchronous and asynchronous serving modes.
+
+    Starts gunicorn with sync workers (`manage:app`) and with gevent
+    workers (`async_app:app`) one after another and sends them the same
+    load of `GET /couriers/$courier_id` and `/orders/assign` requests
+    from many concurrent clients. `--db-latency` adds a delay to every
+    database response through a local proxy to emulate a database
+    on another host, which is when sync workers wait the most.\n
+    WARNING: all tables of the database are dropped and recreated.\n
+    Usage: `python -m benchmarks.serving --database-url URL
+    --clients 200 --db-latency 5`
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy.engine.url import make_url
+
+MODES = {
+    'sync': ['--worker-class', 'sync', 'manage:app'],
+    'gevent': ['--worker-class', 'gevent', '--worker-connections', '1000',
+               'async_app:app']
+}
+
+
+def start_proxy(url, delay):
+    """ Starts a TCP proxy to the database delaying its responses
+        by `delay` seconds and returns the database URL through it
+    """
+    url = make_url(url)
+    port = url.port or 5432
+    socket_dir = url.query.get('host')
+
+    async def pipe(reader, writer, pause):
+        try:
+            while True:
+                data = await reader.read(64 * 1024)
+                if not data:
+                    break
+                if pause:
+                    await asyncio.sleep(pause)
+                writer.write(data)
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def handle(client_reader, client_writer):
+        if socket_dir is not None:
+            server_reader, server_writer = await asyncio.open_unix_connection(
+                os.path.join(socket_dir, f'.s.PGSQL.{port}'))
+        else:
+            server_reader, server_writer = await asyncio.open_connection(
+                url.host or 'localhost', port)
+        await asyncio.gather(pipe(client_reader, server_writer, 0),
+                             pipe(server_reader, client_writer, delay))
+
+    loop = asyncio.new_event_loop()
+    server = loop.run_until_complete(
+        asyncio.start_server(handle, '127.0.0.1', 0))
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    proxy_port = server.sockets[0].getsockname()[1]
+    query = {key: value for key, value in url.query.items() if key != 'host'}
+    return str(url.set(host='127.0.0.1', port=proxy_port, query=query))
+
+
+def prepare(args):
+    os.environ['DATABASE_URL'] = args.database_url
+    from app import app, db
+    from app.utils import CAPACITY
+    with app.app_context():
+        db.session.execute('DROP SCHEMA public CASCADE')
+        db.session.execute('CREATE SCHEMA public')
+        db.session.commit()
+        db.create_all()
+
+    rng = random.Random(args.seed)
+    client = app.test_client()
+    client.post('/couriers', json={'data': [
+        {'courier_id': courier_id,
+         'courier_type': rng.choice(list(CAPACITY)),
+         'regions': [rng.randrange(args.regions)],
+         'working_hours': ['08:00-20:00']}
+        for courier_id in range(1, args.couriers + 1)]})
+    client.post('/orders', json={'data': [
+        {'order_id': order_id,
+         'weight': round(rng.uniform(0.01, 10), 2),
+         'region': rng.randrange(args.regions),
+         'delivery_hours': ['09:00-18:00']}
+        for order_id in range(1, args.couriers * 5 + 1)]})
+
+
+def request(url, data=None):
+    body = None if data is None else json.dumps(data).encode()
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(urllib.request.Request(
+                url, data=body,
+                headers={'Content-Type': 'application/json'})) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as error:
+        status = error.code
+    except OSError:
+        status = None
+    return time.perf_counter() - start, status
+
+
+def wait_ready(base_url, process):
+    for _ in range(100):
+        if process.poll() is not None:
+            sys.exit(f'gunicorn exited with code {process.returncode}')
+        if request(base_url + '/')[1] == 200:
+            return
+        time.sleep(0.1)
+    sys.exit('gunicorn has not started')
+
+
+def run_mode(mode, args, database_url):
+    port = args.port
+    # gunicorn.conf.py doesn't preload the application for gevent
+    # workers by this variable, so gevent doesn't patch the master
+    env = dict(os.environ, DATABASE_URL=database_url, COURIER_CACHE_TTL='0',
+               GUNICORN_WORKER_CLASS=mode)
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '--workers', str(args.workers),
+         '--bind', f'127.0.0.1:{port}', '--log-level', 'warning',
+         *MODES[mode]], env=env)
+    base_url = f'http://127.0.0.1:{port}'
+    try:
+        wait_ready(base_url, process)
+        rng = random.Random(args.seed)
+        calls = []
+        for _ in range(args.requests):
+            courier_id = rng.randint(1, args.couriers)
+            if rng.random() < 0.5:
+                calls.append((f'{base_url}/couriers/{courier_id}', None))
+            else:
+                calls.append((f'{base_url}/orders/assign',
+                              {'courier_id': courier_id}))
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(args.clients) as executor:
+            results = list(executor.map(lambda call: request(*call), calls))
+        elapsed = time.perf_counter() - start
+    finally:
+        process.terminate()
+        process.wait()
+
+    latencies = sorted(latency for latency, _ in results)
+    errors = sum(status != 200 for _, status in results)
+    return {
+        'throughput': len(results) / elapsed,
+        'p50_ms': latencies[len(latencies) // 2] * 1000,
+        'p95_ms': latencies[int(len(latencies) * 0.95)] * 1000,
+        'errors': errors
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--database-url', required=True,
+                        help='throwaway PostgreSQL database')
+    parser.add_argument('--db-latency', type=float, default=0,
+                        help='milliseconds added to database responses')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--clients', type=int, default=200,
+                        help='concurrent requests')
+    parser.add_argument('--requests', type=int, default=4000)
+    parser.add_argument('--couriers', type=int, default=500)
+    parser.add_argument('--regions', type=int, default=10)
+    parser.add_argument('--port', type=int, default=8091)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    prepare(args)
+    database_url = args.database_url
+    if args.db_latency > 0:
+        database_url = start_proxy(database_url, args.db_latency / 1000)
+
+    print(f'{args.requests} requests from {args.clients} clients, '
+          f'{args.workers} workers, database latency {args.db_latency} ms')
+    for mode in MODES:
+        result = run_mode(mode, args, database_url)
+        print(f'{mode:<8}{result["throughput"]:>8.0f} req/s'
+              f'{result["p50_ms"]:>10.1f} ms p50{result["p95_ms"]:>10.1f} '
+              f'ms p95{result["errors"]:>6} errors')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+""" Benchmark and parity check of couriers and orders validators.
+
+    Generates valid and invalid couriers and orders, checks that
+    `app.validators` return exactly the same errors as marshmallow
+    schemas for every element and compares their speed.\n
+    Usage: `python -m benchmarks.validation --elements 20000`
+"""
+import argparse
+import random
+import sys
+import time
+from app.schemas import courier_schema, order_schema
+from app.validators import courier_validator, order_validator
+
+PERIODS = ['09:00-18:00', '9:5-10:00', '00:00-23:59', '12:00-12:00',
+           '18:00-09:00', '24:00-25:00', '10:60-11:00', '10:00', '1-2-3',
+           '10:00-11', 'aa:bb-cc:dd', ' 9:00-10:00', '09:00-10:00\n',
+           '009:00-10:00', '+9:00-10:00', '', '٩:00-10:00']
+VALUES = [0, 1, 7, -1, 2 ** 70, 0.5, 1.0, 0.004, 0.01, 49.999, 50, 50.01,
+          float('nan'), float('inf'), True, False, None, '1', 'foot',
+          'bike', 'car', 'van', [], [1], {}, [None]]
+
+
+def random_value(rng, valid, invalid):
+    """ Returns a valid value with probability 0.8 """
+    if rng.random() < 0.8:
+        return valid()
+    return rng.choice(invalid)()
+
+
+def random_periods(rng):
+    return random_value(
+        rng,
+        lambda: [rng.choice(PERIODS[:4]) for _ in range(rng.randint(1, 3))],
+        [lambda: [rng.choice(PERIODS) for _ in range(rng.randint(0, 3))],
+         lambda: [rng.choice(VALUES)],
+         lambda: rng.choice(VALUES)])
+
+
+def random_courier(rng, courier_id):
+    return {
+        'courier_id': random_value(rng, lambda: courier_id,
+                                   [lambda: rng.choice(VALUES)]),
+        'courier_type': random_value(
+            rng, lambda: rng.choice(['foot', 'bike', 'car']),
+            [lambda: rng.choice(VALUES)]),
+        'regions': random_value(
+            rng,
+            lambda: [rng.randint(0, 100) for _ in range(rng.randint(1, 5))],
+            [lambda: [rng.choice(VALUES) for _ in range(rng.randint(0, 3))],
+             lambda: rng.choice(VALUES)]),
+        'working_hours': random_periods(rng)
+    }
+
+
+def random_order(rng, order_id):
+    return {
+        'order_id': random_value(rng, lambda: order_id,
+                                 [lambda: rng.choice(VALUES)]),
+        'weight': random_value(
+            rng, lambda: round(rng.uniform(0.01, 50), rng.randint(0, 3)),
+            [lambda: rng.choice(VALUES)]),
+        'region': random_value(rng, lambda: rng.randint(0, 100),
+                               [lambda: rng.choice(VALUES)]),
+        'delivery_hours': random_periods(rng)
+    }
+
+
+def errors(validate, element, **kwargs):
+    """ Returns errors as a `str` like `'POST'` routings do
+        or the type of the raised exception
+    """
+    try:
+        return str(validate(element, **kwargs))
+    except Exception as error:
+        return type(error)
+
+
+def check_parity(schema, validator, elements, **kwargs):
+    """ Returns elements which errors differ """
+    return [element for element in elements
+            if errors(schema.validate, element, **kwargs) !=
+            errors(validator.validate, element, **kwargs)]
+
+
+def timing(validate, elements):
+    start = time.perf_counter()
+    for element in elements:
+        try:
+            validate(element)
+        except ValueError:
+            pass
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--elements', type=int, default=20000,
+                        help='couriers and orders generated')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    datasets = {
+        'couriers': (courier_schema, courier_validator,
+                     [random_courier(rng, i) for i in range(args.elements)]),
+        'orders': (order_schema, order_validator,
+                   [random_order(rng, i) for i in range(args.elements)])
+    }
+
+    mismatches = 0
+    for data_type, (schema, validator, elements) in datasets.items():
+        different = check_parity(schema, validator, elements)
+        different += check_parity(schema, validator,
+                                  [{'courier_id': element.get('courier_id')}
+                                   for element in elements[:1000]],
+                                  partial=True)
+        mismatches += len(different)
+        for element in different[:10]:
+            print(f'Mismatch for {data_type}: {element}')
+
+        schema_time = timing(schema.validate, elements)
+        validator_time = timing(validator.validate, elements)
+        print(f'{data_type:<9} marshmallow: {schema_time:.3f} s, '
+              f'fast validator: {validator_time:.3f} s, '
+              f'speedup: {schema_time / validator_time:.1f}x')
+
+    print(f'Mismatches: {mismatches}')
+    if mismatches != 0:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -4,3 +4,66 @@ class Config:
     SECRET_KEY = os.getenv("SECRET_KEY")
     SQLALCHEMY_DATABASE_URI = os.getenv("DATABASE_URL")
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Database connections pool of every worker: connections kept open,
+    # extra connections opened under load, seconds a request waits for
+    # a free connection, seconds after which a connection is replaced
+    # and its check before use ("0" disables it)
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+    DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 5))
+    DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 10))
+    DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))
+    DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1") == "1"
+    # Milliseconds a single SQL statement may run for (0 disables it)
+    DB_STATEMENT_TIMEOUT = int(os.getenv("DB_STATEMENT_TIMEOUT", 10000))
+    if (SQLALCHEMY_DATABASE_URI or '').startswith('postgres'):
+        SQLALCHEMY_ENGINE_OPTIONS = {
+            'pool_size': DB_POOL_SIZE,
+            'max_overflow': DB_MAX_OVERFLOW,
+            'pool_timeout': DB_POOL_TIMEOUT,
+            'pool_recycle': DB_POOL_RECYCLE,
+            'pool_pre_ping': DB_POOL_PRE_PING,
+            'connect_args': {
+                'options': f'-c statement_timeout={DB_STATEMENT_TIMEOUT}'
+            }
+        }
+    # Seconds couriers' information is cached for by every worker
+    # (0 disables the cache) and maximal number of cached couriers
+    COURIER_CACHE_TTL = float(os.getenv("COURIER_CACHE_TTL", 2))
+    COURIER_CACHE_SIZE = int(os.getenv("COURIER_CACHE_SIZE", 10000))
+    # Seconds responses of assignments and completions are replayed for
+    # requests retried with the same `Idempotency-Key` header (0 disables
+    # it), maximal number of responses kept by every worker and whether
+    # they are also saved in the database shared by workers ("1")
+    IDEMPOTENCY_TTL = float(os.getenv("IDEMPOTENCY_TTL", 600))
+    IDEMPOTENCY_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", 10000))
+    IDEMPOTENCY_DB = os.getenv("IDEMPOTENCY_DB", "0") == "1"
+    # Number of couriers or orders validated and inserted at once
+    # and `POST` payload size in bytes starting from which it is
+    # parsed incrementally instead of being loaded in memory
+    IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", 5000))
+    STREAM_IMPORT_MIN_SIZE = int(os.getenv("STREAM_IMPORT_MIN_SIZE",
+                                           10 * 1024 * 1024))
+    # Default and maximal number of couriers or orders on a page
+    # of `GET` lists and rows fetched at once by NDJSON export
+    LIST_PAGE_SIZE = int(os.getenv("LIST_PAGE_SIZE", 100))
+    LIST_MAX_PAGE_SIZE = int(os.getenv("LIST_MAX_PAGE_SIZE", 1000))
+    EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", 1000))
+    # Orders assignment strategy from `app.assignment.STRATEGIES`
+    # and time in seconds it may spend on a single assignment
+    ASSIGNMENT_STRATEGY = os.getenv("ASSIGNMENT_STRATEGY",
+                                    "branch_and_bound")
+    ASSIGNMENT_TIME_BUDGET = float(os.getenv("ASSIGNMENT_TIME_BUDGET", 0.05))
+    # Maximal number of orders locked and considered by an assignment
+    ASSIGNMENT_CANDIDATES_LIMIT = int(os.getenv("ASSIGNMENT_CANDIDATES_LIMIT",
+                                                1000))
+    # In-memory index of orders available for assignment used instead
+    # of the database lookup ("1" enables it) and seconds after which
+    # every worker rebuilds it picking up changes of other workers
+    ORDER_INDEX = os.getenv("ORDER_INDEX", "0") == "1"
+    ORDER_INDEX_TTL = float(os.getenv("ORDER_INDEX_TTL", 60))
+    # New orders are matched with couriers who have nothing to deliver
+    # right away, `/orders/assign` returns them ("1" enables it)
+    PUSH_ASSIGNMENT = os.getenv("PUSH_ASSIGNMENT", "0") == "1"
+    # Per-request SQL queries and time in response headers
+    # and `/metrics` routing ("1" enables them)
+    METRICS = os.getenv("METRICS", "0") == "1"
@@ -0,0 +1,45 @@
+""" Gunicorn settings read by `gunicorn` from the working directory.
+
+    Every value can be changed with an environment variable. Defaults
+    are sized for the NGINX server in front of the application: it
+    proxies requests over keep-alive connections and waits for
+    a response up to 60 seconds.
+"""
+import multiprocessing
+import os
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:8080")
+
+# `sync` workers handle one request at a time, `gevent` workers handle
+# many of them concurrently running `async_app` (see its docstring)
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "sync")
+wsgi_app = 'async_app:app' if worker_class == 'gevent' else 'manage:app'
+workers = int(os.getenv("GUNICORN_WORKERS",
+                        multiprocessing.cpu_count() * 2 + 1))
+# Concurrent requests of a gevent worker. NGINX with 1024 connections
+# per worker proxies up to 512 requests at once.
+worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", 512))
+
+# Seconds an idle connection from NGINX is kept open. It's longer than
+# NGINX keeps idle upstream connections, so NGINX never sends a request
+# into a connection which is being closed.
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", 75))
+# Seconds after which a stuck worker is restarted, shorter than NGINX
+# waits for a response
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 30))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", 30))
+
+# The application is loaded once before starting workers, which saves
+# memory and start time. gevent patches the standard library in every
+# worker and should load the application there. The default follows
+# `GUNICORN_WORKER_CLASS`, so set it instead of `--worker-class`.
+preload_app = os.getenv("GUNICORN_PRELOAD",
+                        "0" if worker_class == "gevent" else "1") == "1"
+
+
+def post_fork(server, worker):
+    # Database connections can't be shared with the parent process
+    if server.cfg.preload_app:
+        from app import app, db
+        with app.app_context():
+            db.engine.dispose()
@@ -1,5 +1,13 @@
+import click
+import pickle
+from datetime import datetime, timedelta, timezone
 from flask.cli import FlaskGroup
-from app import app, db
+from flask_migrate import stamp
+from sqlalchemy import inspect, text
+from app import app, db, idempotency_store
+from app.archive import archive_bundles
+from app.models import (CourierRegions, DeliveryHours, IdempotencyKeys,
+                        WorkingHours, period_minutes)
 
 
 cli = FlaskGroup(app)
@@ -10,6 +18,179 @@ def create_db():
     db.drop_all()
     db.create_all()
     db.session.commit()
+    # The schema is up to date with all migrations
+    stamp()
+
+
+@cli.command("migrate_pickled_columns")
+def migrate_pickled_columns():
+    """ Moves couriers' regions and working hours and orders'
+        delivery hours from the legacy pickled columns to
+        `courier_regions`, `working_hours` and `delivery_hours`
+        tables and drops the legacy columns afterwards.
+    """
+    # Only the new tables are created, the others are left
+    # to the following migrations
+    db.metadata.create_all(bind=db.engine,
+                           tables=[CourierRegions.__table__,
+                                   WorkingHours.__table__,
+                                   DeliveryHours.__table__])
+    columns = {table: [column['name'] for column
+                       in inspect(db.engine).get_columns(table)]
+               for table in ['couriers', 'orders']}
+
+    if 'regions' in columns['couriers']:
+        regions = []
+        working_hours = []
+        couriers = db.session.execute(text(
+            'SELECT courier_id, regions, working_hours FROM couriers '
+            'ORDER BY courier_id'))
+        for courier_id, courier_regions, courier_hours in couriers:
+            for region_id in pickle.loads(courier_regions):
+                regions.append({'courier_id': courier_id,
+                                'region_id': region_id})
+            for period in pickle.loads(courier_hours):
+                start_minute, end_minute = period_minutes(period)
+                working_hours.append({'courier_id': courier_id,
+                                      'start_minute': start_minute,
+                                      'end_minute': end_minute})
+        if regions:
+            db.session.execute(CourierRegions.__table__.insert(), regions)
+        if working_hours:
+            db.session.execute(WorkingHours.__table__.insert(),
+                               working_hours)
+        db.session.execute(text('ALTER TABLE couriers '
+                                'DROP COLUMN regions, '
+                                'DROP COLUMN working_hours'))
+
+    if 'delivery_hours' in columns['orders']:
+        delivery_hours = []
+        orders = db.session.execute(text(
+            'SELECT order_id, delivery_hours FROM orders ORDER BY order_id'))
+        for order_id, order_hours in orders:
+            for period in pickle.loads(order_hours):
+                start_minute, end_minute = period_minutes(period)
+                delivery_hours.append({'order_id': order_id,
+                                       'start_minute': start_minute,
+                                       'end_minute': end_minute})
+        if delivery_hours:
+            db.session.execute(DeliveryHours.__table__.insert(),
+                               delivery_hours)
+        db.session.execute(text('ALTER TABLE orders '
+                                'DROP COLUMN delivery_hours'))
+
+    db.session.commit()
+
+
+@cli.command("sync_bundle_sequence")
+def sync_bundle_sequence():
+    """ Moves the sequence generating bundles' ids past the largest
+        existing id. Bundles' ids used to be calculated by the
+        application, so the sequence of existing databases lags behind.
+    """
+    db.session.execute(text(
+        "SELECT setval(pg_get_serial_sequence('orders_bundle', 'bundle_id'), "
+        "COALESCE(MAX(bundle_id), 0) + 1, false) FROM orders_bundle"))
+    db.session.commit()
+
+
+@cli.command("add_bundle_counters")
+def add_bundle_counters():
+    """ Adds `open_orders` and `last_complete_time` columns to bundles
+        of existing databases and calculates them from their orders.
+    """
+    db.session.execute(text(
+        'ALTER TABLE orders_bundle '
+        'ADD COLUMN IF NOT EXISTS open_orders INTEGER NOT NULL DEFAULT 0, '
+        'ADD COLUMN IF NOT EXISTS last_complete_time '
+        'TIMESTAMP WITH TIME ZONE'))
+    db.session.execute(text(
+        'UPDATE orders_bundle SET '
+        'open_orders = (SELECT COUNT(*) FROM orders '
+        'WHERE orders.bundle = orders_bundle.bundle_id '
+        'AND NOT orders.completed), '
+        'last_complete_time = (SELECT MAX(complete_time) FROM orders '
+        'WHERE orders.bundle = orders_bundle.bundle_id '
+        'AND orders.completed)'))
+    db.session.commit()
+
+
+@cli.command("recalculate_delivery_stats")
+def recalculate_delivery_stats():
+    """ Adds delivery time sum and completed orders count columns to
+        regions and minimal average delivery time to couriers of
+        existing databases and recalculates them with couriers' ratings
+        from completed orders. Regions' averages used to be calculated
+        as `(average + delivery_time) / 2`, so they are replaced too.
+    """
+    db.session.execute(text(
+        'ALTER TABLE regions '
+        'ADD COLUMN IF NOT EXISTS delivery_time_sum '
+        'DOUBLE PRECISION NOT NULL DEFAULT 0, '
+        'ADD COLUMN IF NOT EXISTS orders_count INTEGER NOT NULL DEFAULT 0'))
+    db.session.execute(text(
+        'ALTER TABLE couriers '
+        'ADD COLUMN IF NOT EXISTS min_avg_delivery_time DOUBLE PRECISION'))
+    db.session.execute(text('DELETE FROM regions'))
+    delivered = ('SELECT region, assigned_courier, delivery_time FROM {} '
+                 'WHERE completed AND delivery_time IS NOT NULL')
+    # Archived orders are counted too. The command runs on upgrade
+    # before migrations, when the archive table may not exist yet.
+    tables = ['orders']
+    if inspect(db.engine).has_table('orders_archive'):
+        tables.append('orders_archive')
+    db.session.execute(text(
+        'INSERT INTO regions (region_id, courier_id, avg_delivery_time, '
+        'delivery_time_sum, orders_count) '
+        'SELECT region, assigned_courier, AVG(delivery_time), '
+        'SUM(delivery_time), COUNT(*) FROM ('
+        + ' UNION ALL '.join(delivered.format(table) for table in tables)
+        + ') AS delivered GROUP BY region, assigned_courier'))
+    db.session.execute(text(
+        'UPDATE couriers SET min_avg_delivery_time = '
+        '(SELECT MIN(delivery_time_sum / orders_count) FROM regions '
+        'WHERE regions.courier_id = couriers.courier_id)'))
+    # Rating is only set when courier completes a bundle
+    db.session.execute(text(
+        'UPDATE couriers SET rating = ROUND(CAST('
+        '(3600 - LEAST(min_avg_delivery_time, 3600)) / 3600 * 5 '
+        'AS NUMERIC), 2) '
+        'WHERE rating IS NOT NULL AND min_avg_delivery_time IS NOT NULL'))
+    db.session.commit()
+
+
+@cli.command("archive_completed")
+@click.option('--days', default=30, show_default=True,
+              help='Archive bundles completed more than DAYS days ago.')
+@click.option('--batch-size', default=1000, show_default=True,
+              help='Bundles moved by a single transaction.')
+def archive_completed(days, batch_size):
+    """ Moves bundles completed more than `days` days ago with their
+        orders to the archive tables. Every batch is moved by its own
+        short transaction, so the command can run on a working
+        database, e.g. daily by cron.
+    """
+    completed_before = datetime.now(timezone.utc) - timedelta(days=days)
+    archived = 0
+    while True:
+        moved = archive_bundles(completed_before, batch_size)
+        if moved == 0:
+            break
+        archived += moved
+    print(f'Archived {archived} bundles')
+
+
+@cli.command("purge_idempotency_keys")
+def purge_idempotency_keys():
+    """ Deletes expired responses saved for retried requests
+        from `idempotency_keys` table
+    """
+    deleted = (IdempotencyKeys.query
+               .filter(IdempotencyKeys.created <=
+                       idempotency_store.expired_before())
+               .delete(synchronize_session=False))
+    db.session.commit()
+    print(f'Deleted {deleted} expired idempotency keys')
 
 
 if __name__ == '__main__':
@@ -0,0 +1,27 @@
+"""Pending bundles
+
+Revision ID: 0adb3f39428f
+Revises: 4ab708738b41
+Create Date: 2026-10-18 20:52:48.491010
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0adb3f39428f'
+down_revision = '4ab708738b41'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Constant default doesn't rewrite the table on PostgreSQL 11+
+    op.add_column('orders_bundle',
+                  sa.Column('pending', sa.Boolean(), nullable=False,
+                            server_default=sa.false()))
+
+
+def downgrade():
+    op.drop_column('orders_bundle', 'pending')
@@ -0,0 +1,53 @@
+"""Indexes for hot filter columns
+
+Revision ID: 4ab708738b41
+Revises: 0bbe9f198488
+Create Date: 2026-10-18 20:45:22.785498
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4ab708738b41'
+down_revision = '0bbe9f198488'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Indexes are built without locking the tables for writes,
+    # which can't be done inside a transaction
+    with op.get_context().autocommit_block():
+        # Databases created before migrations may already have it
+        op.execute('CREATE INDEX CONCURRENTLY IF NOT EXISTS '
+                   'ix_orders_unassigned_region_weight '
+                   'ON orders (region, weight) WHERE NOT assigned')
+        op.create_index('ix_orders_bundle', 'orders', ['bundle'],
+                        unique=False, postgresql_concurrently=True)
+        op.create_index('ix_orders_courier_open', 'orders',
+                        ['assigned_courier'], unique=False,
+                        postgresql_where=sa.text('NOT completed'),
+                        postgresql_concurrently=True)
+        op.create_index('ix_orders_bundle_courier_completed',
+                        'orders_bundle', ['courier_id', 'completed'],
+                        unique=False, postgresql_concurrently=True)
+        op.create_index('ix_regions_courier_region', 'regions',
+                        ['courier_id', 'region_id'], unique=False,
+                        postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_regions_courier_region', table_name='regions',
+                      postgresql_concurrently=True)
+        op.drop_index('ix_orders_bundle_courier_completed',
+                      table_name='orders_bundle',
+                      postgresql_concurrently=True)
+        op.drop_index('ix_orders_courier_open', table_name='orders',
+                      postgresql_concurrently=True)
+        op.drop_index('ix_orders_bundle', table_name='orders',
+                      postgresql_concurrently=True)
+        op.drop_index('ix_orders_unassigned_region_weight',
+                      table_name='orders', postgresql_concurrently=True)
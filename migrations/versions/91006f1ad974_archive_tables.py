@@ -0,0 +1,85 @@
+"""Archive tables
+
+Revision ID: 91006f1ad974
+Revises: c99cb05b4711
+Create Date: 2026-10-18 21:01:07.085080
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '91006f1ad974'
+down_revision = 'c99cb05b4711'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Archived rows keep their ids, so primary keys have no sequences
+    op.create_table('orders_bundle_archive',
+                    sa.Column('bundle_id', sa.Integer(), autoincrement=False,
+                              nullable=False),
+                    sa.Column('courier_id', sa.Integer(), nullable=True),
+                    sa.Column('init_courier_type', sa.String(length=8),
+                              nullable=False),
+                    sa.Column('assign_time', sa.DateTime(timezone=True),
+                              nullable=True),
+                    sa.Column('completed', sa.Boolean(), nullable=True),
+                    sa.Column('complete_time', sa.DateTime(timezone=True),
+                              nullable=True),
+                    sa.Column('deleted', sa.Boolean(), nullable=True),
+                    sa.Column('open_orders', sa.Integer(), nullable=False),
+                    sa.Column('last_complete_time',
+                              sa.DateTime(timezone=True), nullable=True),
+                    sa.Column('pending', sa.Boolean(), nullable=False),
+                    sa.PrimaryKeyConstraint('bundle_id'))
+    op.create_index('ix_orders_bundle_archive_courier_id',
+                    'orders_bundle_archive', ['courier_id'], unique=False)
+
+    op.create_table('orders_archive',
+                    sa.Column('order_id', sa.Integer(), autoincrement=False,
+                              nullable=False),
+                    sa.Column('weight', sa.Float(precision=2),
+                              nullable=False),
+                    sa.Column('region', sa.Integer(), nullable=False),
+                    sa.Column('assigned_courier', sa.Integer(),
+                              nullable=True),
+                    sa.Column('assigned', sa.Boolean(), nullable=True),
+                    sa.Column('assign_time', sa.DateTime(timezone=True),
+                              nullable=True),
+                    sa.Column('bundle', sa.Integer(), nullable=True),
+                    sa.Column('completed', sa.Boolean(), nullable=True),
+                    sa.Column('complete_time', sa.DateTime(timezone=True),
+                              nullable=True),
+                    sa.Column('delivery_time', sa.Float(precision=2),
+                              nullable=True),
+                    sa.PrimaryKeyConstraint('order_id'))
+    op.create_index('ix_orders_archive_assigned_courier', 'orders_archive',
+                    ['assigned_courier'], unique=False)
+    op.create_index('ix_orders_archive_bundle', 'orders_archive', ['bundle'],
+                    unique=False)
+
+    op.create_table('delivery_hours_archive',
+                    sa.Column('id', sa.Integer(), autoincrement=False,
+                              nullable=False),
+                    sa.Column('start_minute', sa.Integer(), nullable=False),
+                    sa.Column('end_minute', sa.Integer(), nullable=False),
+                    sa.Column('order_id', sa.Integer(), nullable=False),
+                    sa.PrimaryKeyConstraint('id'))
+    op.create_index('ix_delivery_hours_archive_order_id',
+                    'delivery_hours_archive', ['order_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_delivery_hours_archive_order_id',
+                  table_name='delivery_hours_archive')
+    op.drop_table('delivery_hours_archive')
+    op.drop_index('ix_orders_archive_bundle', table_name='orders_archive')
+    op.drop_index('ix_orders_archive_assigned_courier',
+                  table_name='orders_archive')
+    op.drop_table('orders_archive')
+    op.drop_index('ix_orders_bundle_archive_courier_id',
+                  table_name='orders_bundle_archive')
+    op.drop_table('orders_bundle_archive')
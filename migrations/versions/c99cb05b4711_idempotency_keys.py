@@ -0,0 +1,40 @@
+"""Idempotency keys
+
+Revision ID: c99cb05b4711
+Revises: 0adb3f39428f
+Create Date: 2026-10-18 20:58:50.627312
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c99cb05b4711'
+down_revision = '0adb3f39428f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('idempotency_keys',
+                    sa.Column('route', sa.String(length=64),
+                              nullable=False),
+                    sa.Column('key', sa.String(length=255), nullable=False),
+                    sa.Column('fingerprint', sa.String(length=64),
+                              nullable=False),
+                    sa.Column('status', sa.Integer(), nullable=False),
+                    sa.Column('content_type', sa.String(length=64),
+                              nullable=False),
+                    sa.Column('body', sa.Text(), nullable=False),
+                    sa.Column('created', sa.DateTime(timezone=True),
+                              nullable=False),
+                    sa.PrimaryKeyConstraint('route', 'key'))
+    op.create_index(op.f('ix_idempotency_keys_created'), 'idempotency_keys',
+                    ['created'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_idempotency_keys_created'),
+                  table_name='idempotency_keys')
+    op.drop_table('idempotency_keys')